@@ -1,58 +1,75 @@
 import os
 import json
+import atexit
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
 from datetime import datetime
 
-LOG_FILE = os.path.join(os.path.dirname(__file__), "data/log_ikan.json")
+from box_classifier import get_classifier
+from instrumentation import metrics
+
+LOG_FILE = os.path.join(os.path.dirname(__file__), "data/log_ikan.jsonl")
+LEGACY_LOG_FILE = os.path.join(os.path.dirname(__file__), "data/log_ikan.json")
+DB_FILE = os.path.join(os.path.dirname(__file__), "data/log_ikan.db")
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "data/settings.json")
+LOG_FIELDS = ("waktu", "tipe", "jenis", "berat", "box", "pesan", "lane")
+INSERT_SQL = f"INSERT INTO log (ts, {', '.join(LOG_FIELDS)}) VALUES ({', '.join('?' * (len(LOG_FIELDS) + 1))})"
 
 def klasifikasi_box(jenis: str, berat: float) -> str:
-    jenis = jenis.lower()
+    # Aturan kolom/batas berat diatur di settings.json ("klasifikasi"), lihat box_classifier.py
+    return get_classifier().classify(jenis, berat)
 
-    # Mapping kolom ubah sesuai kebutuhanmu
-    kolom_map = {
-        "mouse": "A",    
-        "phone": "B",
-        "bawal": "C"
-    }
 
-    if jenis not in kolom_map:
-        return "TRASH"
+_ts_lock = threading.Lock()
+_last_ts = 0.0
+
+
+def _timestamp():
+    """Epoch yang dijamin tidak mundur (jam sistem bisa dikoreksi NTP)."""
+    global _last_ts
+    with _ts_lock:
+        _last_ts = max(time.time(), _last_ts + 1e-6)
+        return _last_ts
+
 
-    kolom = kolom_map[jenis]
+def _iso(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds")
 
-    # Baris berdasarkan berat
-    if 0.1 <= berat <= 0.6:
-        baris = "1"
-    elif 0.6 < berat <= 2.0:
-        baris = "2"
-    elif berat > 2.0:
-        baris = "3"
-    else:
-        return "TRASH"
 
-    return kolom + baris
+def format_waktu(ts):
+    """Format tampilan lama untuk panel log: [HH:MM:SS][dd-mm]."""
+    return datetime.fromtimestamp(ts).strftime("[%H:%M:%S][%d-%m]")
 
 
-def simpan_log_deteksi(jenis, berat):
+def simpan_log_deteksi(jenis, berat, lane=None):
     box = klasifikasi_box(jenis, berat)
-    now = datetime.now().strftime("[%H:%M:%S][%d-%m]")
+    ts = _timestamp()
 
     log_data = {
-        "waktu": now,
+        "ts": ts,
+        "waktu": _iso(ts),
         "tipe": "deteksi",
         "jenis": jenis,
         "berat": berat,
         "box": box,
         "pesan": None
     }
+    if lane is not None:
+        # Mode multi-kamera: tiap conveyor punya riwayat sendiri
+        log_data["lane"] = lane
 
     _simpan_log(log_data)
-    print(f"✅ Data tersimpan ke box {box}: {jenis}, {berat} Kg")
+    print(f"✅ Data tersimpan ke box {box}: {jenis}, {berat} Kg" + (f" (lane {lane})" if lane is not None else ""))
+    return box
 
 
 def log_system_activity(pesan):
-    now = datetime.now().strftime("[%H:%M:%S][%d-%m]")
+    ts = _timestamp()
     log_data = {
-        "waktu": now,
+        "ts": ts,
+        "waktu": _iso(ts),
         "tipe": "sistem",
         "jenis": None,
         "berat": None,
@@ -64,35 +81,398 @@ def log_system_activity(pesan):
     print(f"📒 Log sistem: {pesan}")
 
 
-def _simpan_log(log_data):
-    if os.path.exists(LOG_FILE):
+def _parse_waktu_lama(waktu):
+    """"[HH:MM:SS][dd-mm]" -> epoch. Tahun tidak tersimpan, jadi dianggap tahun
+    berjalan, atau tahun lalu kalau hasilnya jatuh di masa depan."""
+    try:
+        dt = datetime.strptime(waktu, "[%H:%M:%S][%d-%m]")
+    except (TypeError, ValueError):
+        return 0.0
+    now = datetime.now()
+    dt = dt.replace(year=now.year)
+    if dt > now:
+        dt = dt.replace(year=now.year - 1)
+    return dt.timestamp()
+
+
+def _normalisasi_waktu(entry, ts_sebelumnya=0.0):
+    """Konversi entri format lama (tanpa "ts", waktu "[HH:MM:SS][dd-mm]") ke epoch + ISO-8601.
+
+    Waktu yang tidak bisa dibaca memakai `ts_sebelumnya` (ts entri sebelumnya) supaya
+    urutan waktu tetap naik; teks waktu aslinya dibiarkan.
+    """
+    waktu = entry.get("waktu")
+    if "ts" not in entry or (isinstance(waktu, str) and waktu.startswith("[")):
+        ts = entry.get("ts") or _parse_waktu_lama(waktu)
+        if ts:
+            entry["waktu"] = _iso(ts)
+        else:
+            ts = ts_sebelumnya
+        entry["ts"] = ts
+    return entry
+
+
+class TimeIndex:
+    """Index waktu terurut (ts -> offset byte) untuk query rentang dengan bisect."""
+
+    def __init__(self):
+        self.ts = []
+        self.offsets = []
+
+    def add(self, ts, offset):
+        self.ts.append(ts)
+        self.offsets.append(offset)
+
+    def range(self, mulai=None, sampai=None):
+        """Posisi [lo, hi) untuk mulai <= ts < sampai."""
+        lo = 0 if mulai is None else bisect_left(self.ts, mulai)
+        hi = len(self.ts) if sampai is None else bisect_left(self.ts, sampai)
+        return lo, hi
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def _cocok(entry, box=None, jenis=None, tipe=None, berat_min=None, berat_max=None, lane=None):
+    berat = entry.get("berat")
+    if lane is not None and entry.get("lane") != lane:
+        return False
+    if box is not None and entry.get("box") != box:
+        return False
+    if jenis is not None and entry.get("jenis") != jenis:
+        return False
+    if tipe is not None and entry.get("tipe") != tipe:
+        return False
+    if berat_min is not None and (berat is None or berat < berat_min):
+        return False
+    if berat_max is not None and (berat is None or berat > berat_max):
+        return False
+    return True
+
+
+class JsonlLogStore:
+    """Penulis log append-only, satu entri JSON per baris.
+
+    File tetap terbuka; tiap entri langsung di-flush (pembaca lain melihatnya),
+    sedangkan fsync dikumpulkan per `fsync_every` entri atau `fsync_interval` detik.
+    Entri tersimpan sesuai urutan tulis (ts tidak mundur), jadi query tidak perlu
+    sort; rentang waktu dicari lewat TimeIndex yang dibangun bertahap.
+    """
+
+    def __init__(self, path, fsync_every=20, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self._f = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.index_lock = threading.Lock()
+        self.time_index = TimeIndex()
+        self._indexed_upto = 0
+
+    def _open(self):
+        if self._f is None:
+            migrasi_log_json(LEGACY_LOG_FILE, self.path)
+            potong_baris_rusak(self.path)
+            self._f = open(self.path, "a", encoding="utf-8")
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            self._open()
+            self._f.write(line)
+            self._f.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self._f is not None:
+                self._sync()
+                self._f.close()
+                self._f = None
+
+    def _refresh_index(self):
+        # Hanya baca bagian file yang belum ter-index; baris belum lengkap dilewati dulu
+        migrasi_log_json(LEGACY_LOG_FILE, self.path)
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed_upto)
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                self._indexed_upto = f.tell()
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                ts_sebelumnya = self.time_index.ts[-1] if self.time_index.ts else 0.0
+                self.time_index.add(_normalisasi_waktu(entry, ts_sebelumnya)["ts"], offset)
+
+    def query(self, limit=None, offset=0, urut_terbaru=False, setelah_id=None, mulai=None, sampai=None, **filters):
+        # id = posisi entri di file (mulai 1), sama dengan posisi di TimeIndex
+        with self.index_lock:
+            self._refresh_index()
+            lo, hi = self.time_index.range(mulai, sampai)
+            index_ts = self.time_index.ts
+            offsets = self.time_index.offsets
+        if setelah_id is not None:
+            lo = max(lo, setelah_id)
+        positions = range(hi - 1, lo - 1, -1) if urut_terbaru else range(lo, hi)
+
+        hasil = []
+        if not positions:
+            return hasil
+        with open(self.path, "rb") as f:
+            for pos in positions:
+                f.seek(offsets[pos])
+                # ts dari index, jadi entri yang waktunya tidak terbaca sama dengan saat di-index
+                entry = _normalisasi_waktu(json.loads(f.readline()), index_ts[pos])
+                entry["id"] = pos + 1
+                if not _cocok(entry, **filters):
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                hasil.append(entry)
+                if limit is not None and len(hasil) >= limit:
+                    break
+        return hasil
+
+
+class SqliteLogStore:
+    """Riwayat deteksi di SQLite (mode WAL) dengan index waktu, box dan jenis.
+
+    Satu koneksi tulis dijaga lock; tiap thread pembaca (mis. UI) memakai
+    koneksinya sendiri sehingga bisa membaca selagi detector menulis.
+    """
+
+    def __init__(self, path, import_jsonl=LOG_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._conn = self._connect()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                waktu TEXT,
+                tipe TEXT,
+                jenis TEXT,
+                berat REAL,
+                box TEXT,
+                pesan TEXT,
+                lane TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_log_ts ON log(ts);
+            CREATE INDEX IF NOT EXISTS idx_log_box_ts ON log(box, ts);
+            CREATE INDEX IF NOT EXISTS idx_log_jenis_ts ON log(jenis, ts);
+            """
+        )
+        kolom = {row["name"] for row in self._conn.execute("PRAGMA table_info(log)")}
+        if "lane" not in kolom:
+            # Database dari versi sebelum multi-lane
+            self._conn.execute("ALTER TABLE log ADD COLUMN lane TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_log_lane_ts ON log(lane, ts)")
+        if import_jsonl and self._conn.execute("SELECT COUNT(*) FROM log").fetchone()[0] == 0:
+            self._import(JsonlLogStore(import_jsonl).query())
+        self._konversi_waktu_lama()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _import(self, entries):
+        if not entries:
+            return
+        rows = [(e["ts"],) + tuple(e.get(k) for k in LOG_FIELDS) for e in entries]
+        with self.lock, self._conn:
+            self._conn.executemany(INSERT_SQL, rows)
+        print(f"📦 {len(rows)} entri log diimpor ke {self.path}")
+
+    def _konversi_waktu_lama(self):
+        rows = self._conn.execute("SELECT id, ts, waktu FROM log WHERE waktu LIKE '[%' ORDER BY id").fetchall()
+        if not rows:
+            return
+        updates = []
+        ts_sebelumnya = 0.0
+        for row in rows:
+            # ts yang sudah ada (mis. dari impor JSONL) dipertahankan jika waktunya tidak terbaca
+            entry = _normalisasi_waktu({"waktu": row["waktu"]}, row["ts"] or ts_sebelumnya)
+            ts_sebelumnya = entry["ts"]
+            updates.append((entry["ts"], entry["waktu"], row["id"]))
+        with self.lock, self._conn:
+            self._conn.executemany("UPDATE log SET ts = ?, waktu = ? WHERE id = ?", updates)
+        dikonversi = sum(1 for _, waktu, _ in updates if not waktu.startswith("["))
+        if dikonversi:
+            print(f"🕒 {dikonversi} entri log format lama dikonversi")
+
+    def append(self, entry):
+        ts = entry.get("ts") or _timestamp()
+        with self.lock, self._conn:
+            self._conn.execute(INSERT_SQL, (ts,) + tuple(entry.get(k) for k in LOG_FIELDS))
+
+    def query(self, limit=None, offset=0, urut_terbaru=False, setelah_id=None, mulai=None, sampai=None, box=None, jenis=None, tipe=None, berat_min=None, berat_max=None, lane=None):
+        where, params = [], []
+        for kolom, op, nilai in (
+            ("id", ">", setelah_id),
+            ("ts", ">=", mulai), ("ts", "<", sampai), ("box", "=", box), ("jenis", "=", jenis),
+            ("tipe", "=", tipe), ("berat", ">=", berat_min), ("berat", "<=", berat_max), ("lane", "=", lane),
+        ):
+            if nilai is not None:
+                where.append(f"{kolom} {op} ?")
+                params.append(nilai)
+
+        sql = "SELECT * FROM log"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # id = urutan tulis dan ts tidak pernah mundur, jadi cukup urut id (tanpa sort)
+        sql += " ORDER BY id DESC" if urut_terbaru else " ORDER BY id"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    def update_boxes(self, pairs):
+        """pairs: [(box, id), ...]"""
+        with self.lock, self._conn:
+            self._conn.executemany("UPDATE log SET box = ? WHERE id = ?", pairs)
+
+    def close(self):
+        with self.lock:
+            self._conn.close()
+
+
+def potong_baris_rusak(path):
+    """Buang baris terakhir yang terpotong (crash di tengah penulisan)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        pos = f.tell()
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            idx = f.read(step).rfind(b"\n")
+            if idx != -1:
+                f.truncate(pos + idx + 1)
+                break
+        else:
+            f.truncate(0)
+    print(f"⚠️ Baris log terakhir rusak dan dipotong: {path}")
+
+
+def migrasi_log_json(legacy_path=LEGACY_LOG_FILE, path=LOG_FILE):
+    """Pindahkan log_ikan.json lama (satu array JSON) ke format JSONL, sekali saja."""
+    if not os.path.exists(legacy_path) or (os.path.exists(path) and os.path.getsize(path) > 0):
+        return 0
+
+    try:
+        with open(legacy_path, "r") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Log lama rusak, tidak dimigrasi: {e}")
+        return 0
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in data:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    os.replace(legacy_path, legacy_path + ".migrated")
+    print(f"📦 {len(data)} entri log dimigrasi ke {path}")
+    return len(data)
+
+
+def _buat_store():
+    """Pilih penyimpanan log dari settings.json ("log": {"backend": "sqlite" | "jsonl"})."""
+    backend = "sqlite"
+    if os.path.exists(SETTINGS_FILE):
         try:
-            with open(LOG_FILE, "r") as f:
-                data = json.load(f)
+            with open(SETTINGS_FILE, "r") as f:
+                backend = json.load(f).get("log", {}).get("backend", backend)
         except json.JSONDecodeError:
-            data = []
-    else:
-        data = []
+            pass
+    if backend == "jsonl":
+        return JsonlLogStore(LOG_FILE)
+    return SqliteLogStore(DB_FILE)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = _buat_store()
+            atexit.register(_store.close)
+        return _store
+
 
-    data.append(log_data)
+def gunakan_store(store):
+    """Ganti penyimpanan log (mis. database sementara untuk benchmark/replay)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def _simpan_log(log_data):
+    with metrics.timer("log_write"):
+        _get_store().append(log_data)
+    metrics.count("log_writes")
+
+
+def ambil_log(limit=None, offset=0, urut_terbaru=False, **filters):
+    """Query riwayat: limit/offset, setelah_id, rentang waktu (mulai/sampai epoch), box, jenis, tipe, berat_min/berat_max, lane."""
+    return _get_store().query(limit=limit, offset=offset, urut_terbaru=urut_terbaru, **filters)
 
-    with open(LOG_FILE, "w") as f:
-        json.dump(data, f, indent=2)
 
 def ambil_semua_log(urut_terbaru=False):
-    if not os.path.exists(LOG_FILE):
-        return []
+    return ambil_log(urut_terbaru=urut_terbaru)
 
-    try:
-        with open(LOG_FILE, "r") as f:
-            data = json.load(f)
-    except json.JSONDecodeError:
-        return []
 
-    # Urutkan berdasarkan waktu (desc/asc)
-    if urut_terbaru:
-        data.sort(key=lambda x: x.get("waktu", ""), reverse=True)
-    else:
-        data.sort(key=lambda x: x.get("waktu", ""))
+def klasifikasi_ulang_riwayat(**filters):
+    """Hitung ulang box semua deteksi (mis. setelah aturan box berubah) dengan jalur NumPy.
+
+    Hanya untuk penyimpanan SQLite; log JSONL bersifat append-only.
+    """
+    store = _get_store()
+    if not isinstance(store, SqliteLogStore):
+        raise TypeError("Klasifikasi ulang hanya didukung untuk log SQLite")
 
-    return data
\ No newline at end of file
+    rows = store.query(tipe="deteksi", **filters)
+    if not rows:
+        return 0
+    boxes = get_classifier().classify_many([r["jenis"] for r in rows], [r["berat"] for r in rows])
+    changed = [(box, r["id"]) for box, r in zip(boxes, rows) if box != r["box"]]
+    store.update_boxes(changed)
+    print(f"📦 {len(changed)} dari {len(rows)} deteksi pindah box")
+    return len(changed)
@@ -0,0 +1,217 @@
+"""Replay headless seluruh pipeline sortir (tanpa Tk) dan ukur performanya.
+
+Input: video rekaman (atau folder frame) + trace berat CSV ("t,berat", t = detik
+sejak awal video). Waktu disimulasikan dari nomor frame / fps, jadi hasil deteksi
+stabil dan pemasangan berat bisa diulang persis sama.
+
+Contoh:
+    python benchmark.py --video rekaman.mp4 --weights berat.csv --save-baseline benchmark_baseline.json
+    python benchmark.py --video rekaman.mp4 --weights berat.csv --baseline benchmark_baseline.json
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+import backend_log
+from backend_log import SqliteLogStore, klasifikasi_box, simpan_log_deteksi
+from computer_vision import SimpleDetector, buat_motion_gate
+from fusion import SortFusion
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def iter_frames(source):
+    if os.path.isdir(source):
+        for path in sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(IMAGE_EXTS)):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame
+        return
+    cap = cv2.VideoCapture(source)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def load_weight_trace(path):
+    if path is None:
+        return []
+    with open(path, newline="") as f:
+        rows = [(float(r[0]), float(r[1])) for r in csv.reader(f) if r and not r[0].startswith(("#", "t"))]
+    return sorted(rows)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - t0)
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds * 1000)
+
+    def summary(self):
+        hasil = {}
+        for name, values in self.samples.items():
+            arr = np.array(values)
+            hasil[name] = {
+                "count": int(arr.size),
+                "p50_ms": float(np.percentile(arr, 50)),
+                "p95_ms": float(np.percentile(arr, 95)),
+                "p99_ms": float(np.percentile(arr, 99)),
+            }
+        return hasil
+
+
+def run(args):
+    settings = {}
+    if os.path.exists(args.settings):
+        with open(args.settings, "r") as f:
+            settings = json.load(f)
+
+    motion_gate = buat_motion_gate(settings.get("motion_gate"))
+    detector = SimpleDetector(args.model, args.labels, backend=args.backend, motion_gate=motion_gate, rois=settings.get("roi", []))
+    detector.warmup()
+
+    # Log ke database sementara supaya riwayat produksi tidak tercampur
+    tmp_dir = tempfile.mkdtemp(prefix="fish-bench-")
+    log_store = SqliteLogStore(os.path.join(tmp_dir, "log.db"), import_jsonl=None)
+    backend_log.gunakan_store(log_store)
+    try:
+        fusion_settings = settings.get("fusion", {})
+        fusion = SortFusion(offset=fusion_settings.get("offset", 1.5), window=fusion_settings.get("window", 0.75))
+        weights = deque(load_weight_trace(args.weights))
+
+        timer = StageTimer()
+        frames = iter_frames(args.video)
+        n_frames = 0
+        n_events = 0
+        t_start = time.perf_counter()
+
+        while args.limit is None or n_frames < args.limit:
+            with timer.stage("capture"):
+                frame = next(frames, None)
+            if frame is None:
+                break
+            now = n_frames / args.fps
+            n_frames += 1
+
+            calls_before = detector.backend.calls
+            with timer.stage("detect"):
+                label, conf, is_detected = detector.stable_detect(frame, now)
+            if detector.backend.calls != calls_before:
+                timer.add("inference", detector.backend.last_latency)
+
+            with timer.stage("fusion"):
+                if is_detected:
+                    fusion.add_detection(now, label, conf)
+                while weights and weights[0][0] <= now:
+                    fusion.add_weight(*weights.popleft())
+                fusion.expire(now)
+
+            while not fusion.events.empty():
+                event = fusion.events.get_nowait()
+                with timer.stage("classify"):
+                    klasifikasi_box(event["label"], event["berat"])
+                with timer.stage("log"):
+                    simpan_log_deteksi(event["label"], event["berat"])
+                n_events += 1
+
+        elapsed = time.perf_counter() - t_start
+        report = {
+            "frames": n_frames,
+            "sort_events": n_events,
+            "elapsed_s": elapsed,
+            "fps": n_frames / elapsed if elapsed else 0.0,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "backend": detector.backend.name,
+            "stages": timer.summary(),
+            "fusion": fusion.stats(),
+            "motion_gate": motion_gate.stats() if motion_gate else None,
+        }
+        return report
+    finally:
+        # Jangan tinggalkan database sementara di /tmp setiap kali benchmark dijalankan
+        log_store.close()
+        backend_log.gunakan_store(None)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def print_report(report):
+    print()
+    print(f"🎞️  {report['frames']} frame, {report['sort_events']} event sortir dalam {report['elapsed_s']:.2f} s")
+    print(f"⚡ Throughput: {report['fps']:.1f} fps  |  backend: {report['backend']}  |  max RSS: {report['max_rss_mb']:.0f} MB")
+    print(f"{'Stage':<12}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, st in report["stages"].items():
+        print(f"{name:<12}{st['count']:>8}{st['p50_ms']:>10.2f}{st['p95_ms']:>10.2f}{st['p99_ms']:>10.2f}")
+
+
+def compare(report, baseline, tolerance):
+    """Daftar regresi: fps turun atau p95 stage naik lebih dari `tolerance` (fraksi)."""
+    regressions = []
+    if report["fps"] < baseline["fps"] * (1 - tolerance):
+        regressions.append(f"fps {baseline['fps']:.1f} -> {report['fps']:.1f}")
+    for name, base in baseline.get("stages", {}).items():
+        cur = report["stages"].get(name)
+        if cur and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name} p95 {base['p95_ms']:.2f} -> {cur['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless pipeline sortir ikan")
+    parser.add_argument("--video", required=True, help="file video atau folder frame")
+    parser.add_argument("--weights", help="trace berat CSV: t,berat")
+    parser.add_argument("--fps", type=float, default=25.0, help="fps rekaman untuk waktu simulasi")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--model", default="data/keras_model.h5")
+    parser.add_argument("--labels", default="data/labels.txt")
+    parser.add_argument("--backend", default="tflite")
+    parser.add_argument("--settings", default="data/settings.json")
+    parser.add_argument("--save-baseline", help="simpan hasil sebagai baseline JSON")
+    parser.add_argument("--baseline", help="bandingkan dengan baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="toleransi regresi (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline disimpan: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regresi performa:")
+            for r in regressions:
+                print(f"   {r}")
+            sys.exit(1)
+        print("✅ Tidak ada regresi dibanding baseline")
+
+
+if __name__ == "__main__":
+    main()
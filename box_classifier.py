@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "data/settings.json")
+LABELS_FILE = os.path.join(os.path.dirname(__file__), "data/labels.txt")
+
+# Sama dengan aturan lama di klasifikasi_box
+DEFAULT_KOLOM = {"mouse": "A", "phone": "B", "bawal": "C"}
+DEFAULT_BATAS_BERAT = [0.1, 0.6, 2.0]
+TRASH = "TRASH"
+CHECK_INTERVAL = 2.0  # detik antar cek mtime settings.json/labels.txt
+
+
+class BoxClassifier:
+    """Tabel jenis -> kolom dan batas berat -> baris, dibangun sekali dari config.
+
+    Dengan batas [b0, b1, b2]: berat < b0 -> TRASH, b0..b1 -> baris 1,
+    (b1, b2] -> baris 2, > b2 -> baris 3 (seperti if/elif lama).
+    """
+
+    def __init__(self, kolom=None, batas_berat=None, labels=None):
+        self.kolom = {jenis.lower(): col for jenis, col in (kolom or DEFAULT_KOLOM).items()}
+        self.batas_berat = sorted(float(b) for b in (batas_berat or DEFAULT_BATAS_BERAT))
+        self.labels = labels or []
+
+        # Tabel untuk jalur NumPy: indeks kolom x baris -> nama box
+        self.kolom_list = sorted(set(self.kolom.values()))
+        self._kolom_idx = {jenis: self.kolom_list.index(col) for jenis, col in self.kolom.items()}
+        jumlah_baris = len(self.batas_berat)
+        self._tabel = np.array([[f"{col}{row}" for row in range(1, jumlah_baris + 1)] + [TRASH] for col in self.kolom_list] + [[TRASH] * (jumlah_baris + 1)], dtype=object)
+        self._batas_atas = np.array(self.batas_berat[1:], dtype=np.float64)
+
+        unknown = [jenis for jenis in self.kolom if self.labels and jenis not in self.labels]
+        if unknown:
+            print(f"⚠️ Jenis di aturan box tidak ada di labels.txt: {', '.join(unknown)}")
+
+    def boxes(self):
+        return [f"{col}{row}" for col in self.kolom_list for row in range(1, len(self.batas_berat) + 1)]
+
+    def classify(self, jenis, berat):
+        col = self.kolom.get((jenis or "").lower())
+        if col is None or berat is None or not berat >= self.batas_berat[0]:
+            return TRASH
+        return f"{col}{bisect_left(self.batas_berat, berat, 1)}"
+
+    def classify_many(self, jenis, berat):
+        """Versi vektor: array jenis dan berat -> array nama box (object)."""
+        jenis = np.asarray(jenis, dtype=object)
+        berat = np.asarray(berat, dtype=np.float64)
+
+        uniq, inverse = np.unique(np.char.lower(jenis.astype(str)), return_inverse=True)
+        trash_col = len(self.kolom_list)
+        col_idx = np.array([self._kolom_idx.get(j, trash_col) for j in uniq], dtype=np.intp)[inverse]
+
+        row_idx = np.searchsorted(self._batas_atas, berat, side="left")
+        too_light = ~(berat >= self.batas_berat[0])  # termasuk NaN
+        row_idx[too_light] = len(self.batas_berat)
+        col_idx[too_light] = trash_col
+        return self._tabel[col_idx, row_idx]
+
+    @classmethod
+    def from_config(cls, settings_path=SETTINGS_FILE, labels_path=LABELS_FILE):
+        return cls.from_settings(_baca_settings(settings_path), labels_path)
+
+    @classmethod
+    def from_settings(cls, settings, labels_path=LABELS_FILE):
+        """Bangun dari dict settings ("klasifikasi", "range") yang sudah dimuat."""
+        labels = []
+        if os.path.exists(labels_path):
+            with open(labels_path, "r", encoding="utf-8") as f:
+                labels = [line.strip().lower() for line in f if line.strip()]
+
+        aturan = settings.get("klasifikasi", {})
+        classifier = cls(aturan.get("kolom"), aturan.get("batas_berat"), labels)
+
+        # "range" berisi koordinat penempatan tiap box; pastikan semua box punya koordinat
+        koordinat = settings.get("range", {})
+        missing = [box for box in classifier.boxes() + [TRASH] if koordinat and box not in koordinat]
+        if missing:
+            print(f"⚠️ Box tanpa koordinat penempatan: {', '.join(missing)}")
+        return classifier
+
+
+def _baca_settings(settings_path):
+    if os.path.exists(settings_path):
+        try:
+            with open(settings_path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            pass
+    return {}
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _aturan_key(settings, labels_path):
+    # Hanya bagian yang memengaruhi classifier; flush settings karena slider lain tidak dihitung
+    return (json.dumps([settings.get("klasifikasi"), settings.get("range")], sort_keys=True), _mtime(labels_path))
+
+
+_lock = threading.Lock()
+_cached = None
+_cached_key = None
+_file_mtimes = None
+_checked_at = 0.0
+
+
+def get_classifier(settings_path=SETTINGS_FILE, labels_path=LABELS_FILE):
+    """Classifier yang sudah dikompilasi.
+
+    mtime settings.json/labels.txt dicek paling sering tiap CHECK_INTERVAL detik;
+    classifier dibangun ulang hanya jika "klasifikasi", "range" atau labels berubah.
+    """
+    global _cached, _cached_key, _file_mtimes, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _cached is not None and now - _checked_at < CHECK_INTERVAL:
+            return _cached
+        _checked_at = now
+        mtimes = (_mtime(settings_path), _mtime(labels_path))
+        if _cached is not None and mtimes == _file_mtimes:
+            return _cached
+        _file_mtimes = mtimes
+        settings = _baca_settings(settings_path)
+        key = _aturan_key(settings, labels_path)
+        if _cached is None or key != _cached_key:
+            _cached = BoxClassifier.from_settings(settings, labels_path)
+            _cached_key = key
+        return _cached
+
+
+def perbarui_classifier(settings, labels_path=LABELS_FILE):
+    """Bangun ulang langsung dari settings di memori (pelanggan SettingsStore), tanpa menunggu file ditulis."""
+    global _cached, _cached_key
+    key = _aturan_key(settings, labels_path)
+    with _lock:
+        if _cached is not None and key == _cached_key:
+            return _cached
+        _cached = BoxClassifier.from_settings(settings, labels_path)
+        _cached_key = key
+        return _cached
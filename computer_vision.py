@@ -1,56 +1,365 @@
 import cv2
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
 import os
 import sys
+import threading
 import time
 from threading import Thread
+from inference_backend import buat_backend, cached_tflite_path
+from instrumentation import metrics
 
 # Tambahan dari testing_webcam_external.py
 class VideoStream:
-    def __init__(self, src):
-        self.stream = cv2.VideoCapture(src, cv2.CAP_FFMPEG)
+    """Thread capture dengan serah-terima frame terbaru.
+
+    Konsumen memanggil `read_new(last_seq)` dan akan menunggu (tanpa spin) sampai
+    ada frame baru. Frame yang tertimpa sebelum dibaca dihitung sebagai dropped,
+    frame yang dibaca ulang lewat `read()` dihitung sebagai duplicate. Jika stream
+    putus, koneksi dibuka ulang dengan backoff eksponensial. File video diputar
+    sesuai fps aslinya dan diulang dari awal, seperti kamera yang tidak berhenti.
+    """
+
+    def __init__(self, src, api=None, max_backoff=10.0):
+        self.src = src
+        self.api = api if api is not None else (cv2.CAP_FFMPEG if isinstance(src, str) else cv2.CAP_ANY)
+        self.max_backoff = max_backoff
+        self.is_file = isinstance(src, str) and os.path.isfile(src)
+        self.frame_interval = 0.0
+        self._next_frame = 0.0
+        self._pass_frames = 0
+        self.cond = threading.Condition()
+        self.grabbed = False
+        self.frame = None
+        self.seq = 0
+        self._consumed_seq = 0
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_duplicate = 0
+        self.reconnects = 0
+        self._stop_event = threading.Event()
+
+        self.stream = None
+        self._open()
+        self.thread = Thread(target=self.update, args=(), daemon=True)
+        self.thread.start()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def _open(self):
+        self.stream = cv2.VideoCapture(self.src, self.api)
         self.stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.grabbed, self.frame = self.stream.read()
-        self.stopped = False
-        Thread(target=self.update, args=(), daemon=True).start()
+        if self.is_file:
+            fps = self.stream.get(cv2.CAP_PROP_FPS)
+            self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 25
+        return self.stream.isOpened()
 
     def update(self):
-        while not self.stopped:
-            if self.stream.isOpened():
-                self.grabbed, self.frame = self.stream.read()
+        backoff = 0.5
+        while not self._stop_event.is_set():
+            with metrics.timer("capture"):
+                grabbed, frame = self.stream.read() if self.stream.isOpened() else (False, None)
+            if not grabbed and self.is_file and self._pass_frames:
+                # Akhir file: putar ulang dari awal
+                self._pass_frames = 0
+                self.stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            if not grabbed:
+                self.stream.release()
+                print(f"⚠️ Stream terputus, sambung ulang dalam {backoff:.1f} s")
+                if self._stop_event.wait(backoff):
+                    break
+                backoff = min(backoff * 2, self.max_backoff)
+                self.reconnects += 1
+                if self._open():
+                    print(f"🔌 Stream tersambung kembali: {self.src}")
+                continue
+
+            backoff = 0.5
+            if self.frame_interval:
+                self._pass_frames += 1
+                delay = self._next_frame - time.monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+                self._next_frame = max(self._next_frame, time.monotonic()) + self.frame_interval
+            with self.cond:
+                dropped = self.seq > self._consumed_seq
+                if dropped:
+                    self.frames_dropped += 1
+                self.grabbed, self.frame = True, frame
+                self.seq += 1
+                self.frames_captured += 1
+                self.cond.notify_all()
+            metrics.count("frames_captured")
+            if dropped:
+                metrics.count("frames_dropped")
+
+    def read_new(self, last_seq=0, timeout=1.0):
+        """Tunggu frame dengan seq > last_seq. Kembalikan (seq, frame) atau (last_seq, None) saat timeout."""
+        with self.cond:
+            ready = self.cond.wait_for(lambda: self.seq > last_seq or self._stop_event.is_set(), timeout)
+            if not ready or self.seq <= last_seq:
+                return last_seq, None
+            self._consumed_seq = self.seq
+            return self.seq, self.frame
 
     def read(self):
-        return self.frame
+        """Frame terakhir tanpa menunggu (perilaku lama)."""
+        with self.cond:
+            if self.seq and self.seq == self._consumed_seq:
+                self.frames_duplicate += 1
+            self._consumed_seq = self.seq
+            return self.frame
+
+    def stats(self):
+        with self.cond:
+            return {
+                "captured": self.frames_captured,
+                "dropped": self.frames_dropped,
+                "duplicate": self.frames_duplicate,
+                "reconnects": self.reconnects,
+            }
 
     def stop(self):
-        self.stopped = True
+        self._stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        self.thread.join(timeout=2.0)
         self.stream.release()
 
+class FramePreprocessor:
+    """Preprocessing tanpa alokasi per frame: resize ke buffer tetap, lalu
+    BGR->RGB + normalisasi /255 dalam satu pass langsung ke tensor float32."""
+
+    def __init__(self, input_shape, batch_size=1):
+        self.input_shape = input_shape
+        h, w = input_shape
+        self.resized = np.empty((h, w, 3), dtype=np.uint8)
+        self.batch = np.empty((batch_size, h, w, 3), dtype=np.float32)
+        self.scale = np.float32(1.0 / 255.0)
+
+    def __call__(self, frame, out=None):
+        """Tulis hasil ke `out` (mis. buffer input interpreter) atau ke buffer internal."""
+        return self.fill([frame], out)
+
+    def fill(self, frames, out=None):
+        """Isi satu slot batch per frame (mis. crop tiap lane) dan kembalikan view out[:n]."""
+        if out is None:
+            out = self.batch
+        h, w = self.input_shape
+        for i, frame in enumerate(frames):
+            cv2.resize(frame, (w, h), dst=self.resized)
+            # [..., ::-1] hanya view (tanpa copy), sekaligus membalik urutan channel
+            np.multiply(self.resized[..., ::-1], self.scale, out=out[i], casting="unsafe")
+        return out[:len(frames)]
+
+class MotionGate:
+    """Gerbang murah sebelum inferensi: hanya loloskan frame bila ada objek di belt.
+
+    Frame diperkecil ke grayscale kecil lalu dibandingkan dengan background rata-rata
+    bergerak. Jika persentase piksel yang berubah melewati `area_threshold`, frame
+    dikirim ke model; gerbang tetap terbuka `hold_frames` frame setelahnya supaya
+    deteksi stabil (1 detik) tetap bisa terkumpul.
+    """
+
+    def __init__(self, pixel_threshold=25, area_threshold=0.01, learning_rate=0.05, hold_frames=10, size=(64, 48)):
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.learning_rate = learning_rate
+        self.hold_frames = hold_frames
+        self.size = tuple(size)
+        w, h = self.size
+        self.small = np.empty((h, w, 3), dtype=np.uint8)
+        self.gray = np.empty((h, w), dtype=np.uint8)
+        self.diff = np.empty((h, w), dtype=np.float32)
+        self.background = None
+        self._hold = 0
+
+        self.frames_checked = 0
+        self.frames_passed = 0
+        self.frames_skipped = 0
+
+    def check(self, frame):
+        """True jika frame perlu diinferensi."""
+        self.frames_checked += 1
+        cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        if self.background is None:
+            self.background = self.gray.astype(np.float32)
+            self.frames_passed += 1
+            return True
+
+        np.subtract(self.gray, self.background, out=self.diff)
+        np.abs(self.diff, out=self.diff)
+        changed = np.count_nonzero(self.diff > self.pixel_threshold) / self.diff.size
+        present = changed >= self.area_threshold
+
+        if present:
+            self._hold = self.hold_frames
+            # Perubahan permanen (cahaya, posisi kamera) tetap terserap pelan-pelan
+            cv2.accumulateWeighted(self.gray, self.background, self.learning_rate * 0.1)
+        else:
+            self._hold = max(0, self._hold - 1)
+            cv2.accumulateWeighted(self.gray, self.background, self.learning_rate)
+
+        if present or self._hold > 0:
+            self.frames_passed += 1
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            "checked": self.frames_checked,
+            "passed": self.frames_passed,
+            "skipped": self.frames_skipped,
+        }
+
+def buat_motion_gate(gate_settings):
+    """MotionGate dari section "motion_gate" settings.json; None jika tidak diaktifkan."""
+    gate_settings = dict(gate_settings or {})
+    if not gate_settings.pop("enabled", False):
+        return None
+    return MotionGate(**gate_settings)
+
+class StableTracker:
+    """Deteksi stabil: confidence >= threshold selama `hold` detik berturut-turut.
+
+    Satu objek hanya menghasilkan satu event; state di-reset saat confidence turun.
+    Tiap lane/kamera memakai tracker sendiri.
+    """
+
+    def __init__(self, threshold=0.8, hold=1.0):
+        self.threshold = threshold
+        self.hold = hold
+        self.reset()
+
+    def reset(self):
+        self.start_time = None
+        self.detected = False
+
+    def update(self, conf, now):
+        if conf < self.threshold:
+            self.reset()
+            return False
+        if self.start_time is None:
+            self.start_time = now
+        elif not self.detected and now - self.start_time >= self.hold:
+            self.detected = True
+            return True
+        return False
+
 class SimpleDetector:
-    def __init__(self, model_path="data/keras_model.h5", labels_path="data/labels.txt", confidence_threshold=0.8):
+    def __init__(self, model_path="data/keras_model.h5", labels_path="data/labels.txt", confidence_threshold=0.8, backend="keras", motion_gate=None, rois=None):
         self.model_path = model_path
         self.labels_path = labels_path
         self.confidence_threshold = confidence_threshold
+        self.backend_name = backend
+        self.backend = None
+        self.motion_gate = motion_gate
         self.input_shape = (224, 224)
         self.class_names = []
-        self.start_time = None
-        self.detected = False
-
-        self.load_model()
-        self.load_labels()
+        self.stable = StableTracker(confidence_threshold)
+        self._batch_preprocessor = None
+        self.startup_times = {}
+
+        self._timed("load_model", self.load_model)
+        self._timed("load_labels", self.load_labels)
+        self.set_rois(rois)
+
+    def set_rois(self, rois):
+        """Atur ROI belt sebagai daftar [x, y, w, h] (piksel frame asli). Kosong = seluruh frame.
+
+        Boleh dipanggil saat worker berjalan: ROI, preprocessor dan batas gate
+        diganti sekaligus dalam satu tuple.
+        """
+        rois = [tuple(int(v) for v in roi) for roi in (rois or []) if len(roi) == 4 and int(roi[2]) > 0 and int(roi[3]) > 0]
+        bounds = None
+        if rois:
+            x0 = min(x for x, _, _, _ in rois)
+            y0 = min(y for _, y, _, _ in rois)
+            x1 = max(x + w for x, _, w, _ in rois)
+            y1 = max(y + h for _, y, _, h in rois)
+            bounds = (x0, y0, x1 - x0, y1 - y0)
+        self._roi_state = (rois, FramePreprocessor(self.input_shape, batch_size=max(1, len(rois))), bounds)
+        self._roi_warned = False
+
+    @property
+    def rois(self):
+        return self._roi_state[0]
+
+    @property
+    def preprocessor(self):
+        return self._roi_state[1]
+
+    @staticmethod
+    def crop(frame, roi):
+        """ROI dipotong ke batas frame; None jika tidak ada piksel yang tersisa."""
+        # Slicing numpy = view, tanpa copy piksel
+        x, y, w, h = roi
+        frame_h, frame_w = frame.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(frame_w, x + w), min(frame_h, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return frame[y0:y1, x0:x1]
+
+    def _timed(self, phase, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        self.startup_times[phase] = time.perf_counter() - t0
+        return result
+
+    def warmup(self, runs=2):
+        """Inferensi awal agar alokasi tensor/graph tidak terjadi di frame pertama."""
+        # Langsung ke _infer: crop ROI dilewati (dummy lebih kecil dari frame kamera),
+        # tapi ukuran batch sama dengan jumlah ROI supaya tensor yang dipakai nanti ikut teralokasi
+        rois, preprocessor, _ = self._roi_state
+        n = max(1, len(rois))
+        dummy = np.zeros((self.input_shape[0], self.input_shape[1], 3), dtype=np.uint8)
+        self._timed("warmup", lambda: [self._infer([dummy] * n, preprocessor, n) for _ in range(runs)])
+        self.stable.reset()
+
+    def report_startup(self):
+        for phase, seconds in self.startup_times.items():
+            print(f"⏱️ {phase:<12} {seconds * 1000:8.1f} ms")
+        # import_tf sudah termasuk di dalam load_model
+        total = sum(v for k, v in self.startup_times.items() if k != "import_tf")
+        print(f"⏱️ {'total':<12} {total * 1000:8.1f} ms")
 
     def load_model(self):
         try:
             if not os.path.exists(self.model_path):
                 raise FileNotFoundError(f"Model file tidak ditemukan: {self.model_path}")
 
+            if self.model_path.endswith(".tflite"):
+                # Model terkuantisasi (lihat quantize_model.py), tanpa Keras
+                self.model = None
+                self.backend = buat_backend("tflite", None, self.model_path)
+                self.input_shape = self.backend.input_shape
+                print(f"✅ Model TFLite dimuat: {self.model_path}")
+                print(f"📐 Input shape: {self.input_shape}")
+                return
+
+            if self.backend_name == "tflite" and os.path.exists(cached_tflite_path(self.model_path)):
+                # Hasil konversi sebelumnya masih cocok dengan hash .h5: lewati TensorFlow/Keras
+                self.model = None
+                self.backend = buat_backend("tflite", None, self.model_path)
+                self.input_shape = self.backend.input_shape
+                print(f"⚡ Model TFLite dari cache: {self.backend.tflite_path}")
+                print(f"📐 Input shape: {self.input_shape}")
+                return
+
             print("🔄 Mencoba memuat model...")
+            t0 = time.perf_counter()
+            from tensorflow import keras
+            import tensorflow.keras.layers as layers
+            self.startup_times["import_tf"] = time.perf_counter() - t0
 
             print("🔧 Mencoba perbaikan manual untuk parameter 'groups'...")
 
-            import tensorflow.keras.layers as layers
             class FixedDepthwiseConv2D(layers.DepthwiseConv2D):
                 def __init__(self, **kwargs):
                     kwargs.pop('groups', None)
@@ -72,11 +381,19 @@ class SimpleDetector:
                 self.input_shape = (input_shape[1], input_shape[2])
 
             print(f"📐 Input shape: {self.input_shape}")
+
+            try:
+                self.backend = buat_backend(self.backend_name, self.model, self.model_path)
+            except Exception as e:
+                print(f"⚠️ Backend '{self.backend_name}' gagal dipakai ({e}), kembali ke keras")
+                self.backend = buat_backend("keras", self.model, self.model_path)
+            print(f"⚙️ Backend inferensi: {self.backend.name}")
             print(f"🎯 Confidence threshold: {self.confidence_threshold:.0%}")
 
         except Exception as e:
+            # Dimuat di thread latar: sys.exit hanya mematikan thread itu, jadi pemanggil yang memutuskan
             print(f"❌ Error loading model: {e}")
-            sys.exit(1)
+            raise RuntimeError(f"Gagal memuat model {self.model_path}: {e}") from e
 
     def load_labels(self):
         try:
@@ -89,50 +406,102 @@ class SimpleDetector:
             print(f"✅ Labels berhasil dimuat: {len(self.class_names)} kelas")
         except Exception as e:
             print(f"❌ Error loading labels: {e}")
-            sys.exit(1)
+            raise RuntimeError(f"Gagal memuat labels {self.labels_path}: {e}") from e
 
     def preprocess(self, frame):
-        resized = cv2.resize(frame, self.input_shape)
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        normalized = rgb.astype(np.float32) / 255.0
-        return np.expand_dims(normalized, axis=0)
+        # Catatan: buffer yang dikembalikan dipakai ulang di frame berikutnya
+        return self.preprocessor(frame)
+
+    def predict_lanes(self, frame):
+        """Klasifikasi semua ROI dalam satu panggilan inferensi; [(label, conf), ...] per ROI yang ada di frame."""
+        rois, preprocessor, _ = self._roi_state
+        crops = [crop for crop in (self.crop(frame, roi) for roi in rois) if crop is not None]
+        if len(crops) < len(rois) and not self._roi_warned:
+            self._roi_warned = True
+            print(f"⚠️ {len(rois) - len(crops)} ROI di luar frame {frame.shape[1]}x{frame.shape[0]}, dilewati")
+        crops = crops or [frame]
+        metrics.count("frames_inferred")
+        return self._infer(crops, preprocessor, len(crops))
+
+    def predict_batch(self, frames, batch_size=None):
+        """Klasifikasi beberapa frame (mis. satu per kamera) dalam satu panggilan inferensi.
+
+        Dengan `batch_size` tetap (>= jumlah frame) ukuran tensor engine tidak
+        berubah-ubah; slot sisa diabaikan.
+        """
+        batch_size = max(batch_size or 0, len(frames))
+        preprocessor = self._batch_preprocessor
+        if preprocessor is None or len(preprocessor.batch) < batch_size:
+            preprocessor = self._batch_preprocessor = FramePreprocessor(self.input_shape, batch_size=batch_size)
+        metrics.count("frames_inferred", len(frames))
+        return self._infer(frames, preprocessor, batch_size)
+
+    def _infer(self, images, preprocessor, batch_size):
+        buffer = self.backend.input_buffer(batch_size)
+        if buffer is not None:
+            # Tulis langsung ke tensor input engine, tanpa set_tensor/copy
+            with metrics.timer("preprocess"):
+                preprocessor.fill(images, out=buffer)
+            del buffer
+            batch = None
+        else:
+            with metrics.timer("preprocess"):
+                preprocessor.fill(images)
+            batch = preprocessor.batch[:batch_size]
+        with metrics.timer("inference"):
+            predictions = self.backend.predict(batch)
+
+        hasil = []
+        for pred in predictions[:len(images)]:
+            class_idx = np.argmax(pred)
+            hasil.append((self.class_names[class_idx], pred[class_idx]))
+        return hasil
 
     def predict(self, frame):
-        processed = self.preprocess(frame)
-        predictions = self.model.predict(processed, verbose=0)
-        class_idx = np.argmax(predictions[0])
-        confidence = predictions[0][class_idx]
-        return self.class_names[class_idx], confidence
-    
-    def stable_detect(self, frame, now):
-        label, conf = self.predict(frame)
-
-        if conf >= self.confidence_threshold:
-            if not hasattr(self, 'start_time') or self.start_time is None:
-                self.start_time = now
-            elif not hasattr(self, 'detected') or not self.detected:
-                if now - self.start_time >= 1.0:
-                    self.detected = True
-                    return label, conf, True  # Deteksi stabil
-        else:
-            self.start_time = None
-            self.detected = False
+        # Dengan beberapa lane, ambil lane dengan confidence tertinggi
+        return max(self.predict_lanes(frame), key=lambda hasil: hasil[1])
+
+    def predict_gated(self, frame):
+        """Seperti predict(), tapi frame belt kosong dilewati lewat motion gate."""
+        bounds = self._roi_state[2]
+        region = self.crop(frame, bounds) if bounds else None
+        if region is None:
+            region = frame
+        if self.motion_gate is not None:
+            with metrics.timer("motion_gate"):
+                lolos = self.motion_gate.check(region)
+            if not lolos:
+                metrics.count("frames_skipped")
+                return "-", 0.0
+        return self.predict(frame)
 
-        return label, conf, False
+    def stable_detect(self, frame, now):
+        label, conf = self.predict_gated(frame)
+        return label, conf, self.stable.update(conf, now)
 
-    def run(self, camera_index="rtsp://192.168.100.10:8554/mystream"):
+    def run(self, camera_index="rtsp://192.168.100.10:8554/mystream", tampilkan=True):
+        """Loop deteksi sederhana. `tampilkan=False` untuk mesin tanpa layar (Ctrl+C untuk keluar)."""
         vs = VideoStream(camera_index)
 
-        print("🎥 Deteksi dimulai. Tekan 'q' untuk keluar.")
+        print("🎥 Deteksi dimulai. Tekan 'q' untuk keluar." if tampilkan else "🎥 Deteksi dimulai (headless). Ctrl+C untuk keluar.")
+        try:
+            self._run_loop(vs, tampilkan)
+        except KeyboardInterrupt:
+            pass
+        vs.stop()
+        if tampilkan:
+            cv2.destroyAllWindows()
+
+    def _run_loop(self, vs, tampilkan):
         start_time = None
         detected = False
-
+        seq = 0
         while True:
-            frame = vs.read()
+            seq, frame = vs.read_new(seq, timeout=1.0)
             if frame is None:
                 continue
 
-            label, conf = self.predict(frame)
+            label, conf = self.predict_gated(frame)
             now = time.time()
 
             if conf >= self.confidence_threshold:
@@ -145,6 +514,9 @@ class SimpleDetector:
                 start_time = None
                 detected = False
 
+            if not tampilkan:
+                continue
+
             # Tampilan
             if conf >= self.confidence_threshold:
                 text = f"{label}: {conf:.1%}"
@@ -157,12 +529,11 @@ class SimpleDetector:
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
-        vs.stop()
-        cv2.destroyAllWindows()
-
 if __name__ == "__main__":
     if not os.path.exists("data/keras_model.h5") or not os.path.exists("data/labels.txt"):
         print("❌ File model atau label tidak ditemukan.")
     else:
         detector = SimpleDetector("data/keras_model.h5", "data/labels.txt")
-        detector.run()
\ No newline at end of file
+        detector.warmup()
+        detector.report_startup()
+        detector.run(tampilkan="--headless" not in sys.argv)
\ No newline at end of file
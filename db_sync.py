@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SPOOL_FILE = os.path.join(os.path.dirname(__file__), "data/offline_spool.db")
+LEGACY_SPOOL_FILE = os.path.join(os.path.dirname(__file__), "data/offline_fish_logs.json")
+RECORD_FIELDS = ("timestamp", "jenis_ikan", "berat_ikan", "box", "lane")
+CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS fish_logs ("
+    "timestamp VARCHAR(32), jenis_ikan VARCHAR(64), berat_ikan DOUBLE, box VARCHAR(16), lane VARCHAR(32))"
+)
+
+
+def buat_record(jenis, berat, box, ts=None, lane=None):
+    ts = time.time() if ts is None else ts
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+        "jenis_ikan": jenis,
+        "berat_ikan": float(berat),
+        "box": box,
+        "lane": lane,  # None = mode satu kamera
+    }
+
+
+class OfflineSpool:
+    """Antrian lokal yang tahan mati listrik (SQLite) untuk record yang belum terkirim."""
+
+    def __init__(self, path=SPOOL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, jenis_ikan TEXT, berat_ikan REAL, box TEXT, lane TEXT)"
+        )
+        # Spool dari versi sebelum ada kolom lane
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(spool)")]
+        if "lane" not in columns:
+            self.conn.execute("ALTER TABLE spool ADD COLUMN lane TEXT")
+        self.conn.commit()
+
+    def append_many(self, rows):
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO spool (timestamp, jenis_ikan, berat_ikan, box, lane) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def peek(self, limit):
+        """[(id, row), ...] paling lama lebih dulu."""
+        with self.lock:
+            cur = self.conn.execute("SELECT id, timestamp, jenis_ikan, berat_ikan, box, lane FROM spool ORDER BY id LIMIT ?", (limit,))
+            return [(r[0], tuple(r[1:])) for r in cur.fetchall()]
+
+    def delete_upto(self, last_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def import_legacy(self, legacy_path=LEGACY_SPOOL_FILE):
+        """Masukkan isi offline_fish_logs.json lama ke spool, sekali saja."""
+        if not os.path.exists(legacy_path):
+            return 0
+        try:
+            with open(legacy_path, "r") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ offline_fish_logs.json rusak, tidak diimpor: {e}")
+            return 0
+        self.append_many([tuple(rec.get(k) for k in RECORD_FIELDS) for rec in data])
+        os.replace(legacy_path, legacy_path + ".migrated")
+        return len(data)
+
+
+class DbSyncService:
+    """Kirim record deteksi ke database secara batch di thread background.
+
+    `connect` adalah callable yang mengembalikan koneksi DB-API (pool MySQL, atau
+    sqlite3 sebagai pengganti untuk uji lokal). Batch dikirim dengan `executemany`
+    saat ukurannya mencapai `batch_size` atau setelah `flush_interval` detik. Jika
+    database tidak bisa dihubungi, batch masuk ke OfflineSpool dan dikirim ulang
+    sekaligus begitu koneksi pulih. `enqueue` tidak pernah menunggu jaringan.
+    """
+
+    def __init__(self, connect, paramstyle="%s", spool=None, batch_size=50, flush_interval=5.0, max_backoff=60.0, max_queue=10000):
+        self.connect = connect
+        self.insert_sql = "INSERT INTO fish_logs (timestamp, jenis_ikan, berat_ikan, box, lane) VALUES ({0}, {0}, {0}, {0}, {0})".format(paramstyle)
+        self.spool = spool if spool is not None else OfflineSpool()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.online = False
+        self._backoff = 1.0
+        self._retry_at = 0.0
+        self._table_ready = False
+        self.records_sent = 0
+        self.last_error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def enqueue(self, record):
+        row = tuple(record.get(k) for k in RECORD_FIELDS)
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            # Antrian memori penuh (DB lama mati): langsung simpan ke disk
+            self.spool.append_many([row])
+
+    def backlog(self):
+        return self.queue.qsize() + len(self.spool)
+
+    def _loop(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self.stopped.is_set() or not self.queue.empty():
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or self.stopped.is_set():
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self._flush(batch)
+
+    def _insert(self, rows):
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            if not self._table_ready:
+                cur.execute(CREATE_TABLE_SQL)
+                try:
+                    cur.execute("SELECT lane FROM fish_logs WHERE 1 = 0")
+                    cur.fetchall()
+                except Exception:
+                    # Tabel lama tanpa kolom lane (sebelum mode multi-lane)
+                    cur.execute("ALTER TABLE fish_logs ADD COLUMN lane VARCHAR(32)")
+                self._table_ready = True
+            cur.executemany(self.insert_sql, rows)
+            conn.commit()
+        finally:
+            conn.close()  # koneksi pool dikembalikan ke pool
+
+    def _flush(self, batch):
+        if time.monotonic() < self._retry_at:
+            self.spool.append_many(batch)
+            return
+        try:
+            sent = self._drain_spool()
+            if batch:
+                self._insert(batch)
+                self.records_sent += len(batch)
+                sent += len(batch)
+            if not sent:
+                return  # tick kosong: tidak ada kontak dengan DB, status online tidak berubah
+            if not self.online:
+                print("🗄️ Database tersambung, sinkronisasi berjalan")
+            self.online = True
+            self._backoff = 1.0
+        except Exception as e:
+            self.spool.append_many(batch)
+            if self.online or self.last_error is None:
+                print(f"⚠️ Database tidak tersedia ({e}), data disimpan offline")
+            self.online = False
+            self.last_error = str(e)
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def _drain_spool(self, chunk=500):
+        """Kirim data lama lebih dulu supaya urutan tetap terjaga; kembalikan jumlah record terkirim."""
+        sent = 0
+        while True:
+            items = self.spool.peek(chunk)
+            if not items:
+                return sent
+            self._insert([row for _, row in items])
+            self.spool.delete_upto(items[-1][0])
+            self.records_sent += len(items)
+            sent += len(items)
+            print(f"📤 {len(items)} record offline terkirim")
+
+
+def mysql_connect_factory(db_settings, pool_size=2):
+    import mysql.connector.pooling
+
+    pool = mysql.connector.pooling.MySQLConnectionPool(
+        pool_name="fish_sync",
+        pool_size=pool_size,
+        host=db_settings.get("host") or "localhost",
+        port=int(db_settings.get("port") or 3306),
+        database=db_settings.get("name"),
+        user=db_settings.get("user"),
+        password=db_settings.get("password"),
+        connection_timeout=5,
+    )
+    return pool.get_connection
+
+
+def buat_sync_service(db_settings):
+    """Bangun service dari settings.json "database"; None jika belum dikonfigurasi.
+
+    "engine": "sqlite" memakai file SQLite (`name`) sebagai pengganti MySQL.
+    """
+    db_settings = db_settings or {}
+    if not db_settings.get("name"):
+        return None
+
+    spool = OfflineSpool()
+    spool.import_legacy()
+    if db_settings.get("engine") == "sqlite":
+        path = db_settings["name"]
+        return DbSyncService(lambda: sqlite3.connect(path), paramstyle="?", spool=spool)
+
+    state = {}
+
+    def connect():
+        # Pool dibuat saat pertama dipakai (di thread sync), bukan saat UI start
+        if "get" not in state:
+            state["get"] = mysql_connect_factory(db_settings)
+        return state["get"]()
+
+    return DbSyncService(connect, paramstyle="%s", spool=spool)
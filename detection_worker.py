@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from threading import Thread
+
+import cv2
+
+from computer_vision import VideoStream
+from instrumentation import metrics
+
+
+class DetectionWorker:
+    """Menjalankan capture -> inferensi -> keputusan di luar loop Tk.
+
+    UI cukup memanggil `latest_frame()` dan `poll_results()` secara berkala,
+    sehingga FPS tampilan dan FPS inferensi tidak saling mengunci.
+    """
+
+    def __init__(self, detector, source=0, on_detection=None, max_queue=8, draw_overlay=True):
+        self.detector = detector
+        self.source = source
+        self.on_detection = on_detection  # dipanggil (ts, label, conf) untuk tiap deteksi stabil
+        self.draw_overlay = draw_overlay  # False untuk headless: tanpa teks dan tanpa frame preview
+        self.results = queue.Queue(maxsize=max_queue)
+        self.active = threading.Event()   # di-set saat sistem START
+        self.stopped = threading.Event()
+
+        self._frame_lock = threading.Lock()
+        self._frame = None
+        self._frame_seq = 0
+        self.stream = None
+        self.thread = None
+        self.errors = 0
+
+    def start(self):
+        self.stream = VideoStream(self.source)
+        self.stopped.clear()
+        self.thread = Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        if self.stream is not None:
+            self.stream.stop()
+        gate = getattr(self.detector, "motion_gate", None)
+        if gate is not None:
+            stats = gate.stats()
+            print(f"🚦 Motion gate: {stats['skipped']} dari {stats['checked']} frame tidak diinferensi")
+
+    def set_detector(self, detector):
+        """Pasang detector setelah model selesai dimuat di background."""
+        self.detector = detector
+
+    def set_active(self, aktif):
+        if aktif:
+            self.active.set()
+        else:
+            self.active.clear()
+
+    def latest_frame(self):
+        """Kembalikan (seq, frame) terakhir yang sudah diberi overlay."""
+        with self._frame_lock:
+            return self._frame_seq, self._frame
+
+    def poll_results(self):
+        """Ambil semua hasil yang sudah selesai tanpa blocking."""
+        hasil = []
+        while True:
+            try:
+                hasil.append(self.results.get_nowait())
+            except queue.Empty:
+                return hasil
+
+    def _loop(self):
+        seq = 0
+        while not self.stopped.is_set():
+            # Blok sampai ada frame baru; frame yang sama tidak diproses dua kali
+            seq, frame = self.stream.read_new(seq, timeout=0.5)
+            if frame is None:
+                continue
+
+            if self.detector is None:
+                # Model masih dimuat: kamera tetap tampil
+                if self.draw_overlay:
+                    cv2.putText(frame, "Memuat model...", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (150, 150, 150), 2)
+                    self._set_frame(frame)
+                continue
+
+            now = time.time()
+            try:
+                self._process(frame, now)
+            except Exception as e:
+                # Satu frame gagal (backend/preprocessing); worker tetap jalan supaya preview tidak beku
+                self.errors += 1
+                metrics.count("detect_errors")
+                print(f"❌ Deteksi gagal: {e}")
+                if self.draw_overlay:
+                    cv2.putText(frame, "Deteksi gagal", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                    self._set_frame(frame)
+                self._publish({"waktu": now, "label": "-", "conf": 0.0, "stabil": False})
+
+    def _process(self, frame, now):
+        with metrics.timer("detect"):
+            label, conf, is_detected = self.detector.stable_detect(frame, now)
+        if is_detected:
+            metrics.count("detections")
+
+        result = {
+            "waktu": now,
+            "label": label,
+            "conf": float(conf),
+            "stabil": is_detected,
+        }
+        if self.active.is_set() and is_detected and self.on_detection is not None:
+            # Berat dipasangkan belakangan oleh SortFusion, tanpa throttle tetap
+            self.on_detection(now, label, conf)
+
+        if self.draw_overlay:
+            with metrics.timer("overlay"):
+                self._draw_overlay(frame, label, conf)
+            self._set_frame(frame)
+        self._publish(result)
+
+    def _set_frame(self, frame):
+        with self._frame_lock:
+            self._frame = frame
+            self._frame_seq += 1
+
+    def _draw_overlay(self, frame, label, conf):
+        if conf >= self.detector.confidence_threshold:
+            cv2.putText(frame, f"{label}: {conf:.1%}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        else:
+            cv2.putText(frame, "🔍 Mencari objek...", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (150, 150, 150), 2)
+
+    def _publish(self, result):
+        # Queue terbatas: kalau UI tertinggal, buang hasil paling lama
+        try:
+            self.results.put_nowait(result)
+        except queue.Full:
+            try:
+                self.results.get_nowait()
+            except queue.Empty:
+                pass
+            self.results.put_nowait(result)
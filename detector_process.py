@@ -0,0 +1,296 @@
+"""Detector di proses terpisah: TensorFlow tidak berebut GIL dengan capture dan Tk.
+
+Frame dikirim lewat satu buffer `multiprocessing.shared_memory`, bukan dipickle:
+proses utama menyalin frame sekali ke buffer, lalu hanya seq yang lewat antrian.
+Proses detector membaca buffer itu langsung sebagai array NumPy dan mengembalikan
+record kecil (seq, label, conf, ...). Satu frame diproses pada satu waktu (pemanggil
+menunggu hasilnya), jadi satu buffer cukup. Ukuran buffer mengikuti frame pertama
+(ROI memakai piksel frame asli, jadi frame tidak pernah di-resize). Watchdog
+menyalakan ulang proses detector jika mati atau macet.
+"""
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from computer_vision import StableTracker
+from instrumentation import metrics
+
+
+class SharedFrame:
+    """Satu buffer frame uint8 berukuran tetap di shared memory."""
+
+    def __init__(self, shape, name=None):
+        self.shape = tuple(shape)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        else:
+            # Proses spawn memakai resource tracker yang sama dengan proses utama,
+            # jadi segmen tidak dihapus saat proses detector mati/di-restart
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, frame):
+        if frame.shape != self.shape or frame.dtype != np.uint8:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} tidak cocok dengan buffer {self.shape} uint8")
+        np.copyto(self.array, frame)
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def buat_detector(config):
+    """Factory default di proses detector (harus fungsi level modul supaya bisa dikirim ke proses spawn)."""
+    from computer_vision import SimpleDetector, buat_motion_gate
+
+    return SimpleDetector(config["model_path"], config["labels_path"], confidence_threshold=config["confidence_threshold"], backend=config["backend"], motion_gate=buat_motion_gate(config.get("motion_gate")), rois=config.get("rois"))
+
+
+def _worker_main(factory, config, buffer_info, requests, results):
+    """Isi proses detector: muat model, lalu proses frame sampai menerima None.
+
+    `buffer_info` = (nama, shape) buffer yang sudah ada, atau None sampai proses
+    utama mengirim ("buffer", ...) bersama frame pertama.
+    """
+    try:
+        detector = factory(config)
+        detector.warmup()
+    except Exception as e:
+        # Model/labels rusak tidak sembuh dengan restart; laporkan lalu keluar
+        results.put(("error", str(e)))
+        return
+    results.put(("ready", detector.backend.name, detector.startup_times))
+
+    shared = SharedFrame(buffer_info[1], name=buffer_info[0]) if buffer_info else None
+    while True:
+        msg = requests.get()
+        if msg is None:
+            break
+        if msg[0] == "rois":
+            detector.set_rois(msg[1])
+            continue
+        if msg[0] == "buffer":
+            if shared is not None:
+                shared.close()
+            shared = SharedFrame(msg[2], name=msg[1])
+            continue
+        _, seq = msg
+        calls = detector.backend.calls
+        label, conf = detector.predict_gated(shared.array)
+        inferred = detector.backend.calls != calls
+        results.put(("result", seq, label, float(conf), inferred, detector.backend.last_latency))
+    if shared is not None:
+        shared.close()
+
+
+class _RemoteBackendStats:
+    """Statistik backend di proses detector, dicerminkan dari record hasil."""
+
+    def __init__(self):
+        self.name = "remote"
+        self.calls = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+
+    @property
+    def avg_latency(self):
+        return self.total_latency / self.calls if self.calls else 0.0
+
+
+class _RemoteGateStats:
+    def __init__(self):
+        self.checked = 0
+        self.skipped = 0
+
+    def stats(self):
+        return {"checked": self.checked, "passed": self.checked - self.skipped, "skipped": self.skipped}
+
+
+class RemoteDetector:
+    """Pengganti SimpleDetector untuk DetectionWorker/SortingPipeline, dengan inferensi di proses lain.
+
+    `stable_detect(frame, now)` menyalin frame ke buffer bersama dan menunggu hasilnya
+    (GIL dilepas selama menunggu). Selama detector dimuat ulang oleh watchdog,
+    hasilnya ("-", 0.0, False) sehingga kamera tetap jalan. Antrian hasil hanya
+    dibaca oleh satu thread (`_read_results`) yang membagikan pesan "ready" dan "result".
+    """
+
+    def __init__(self, model_path, labels_path, confidence_threshold=0.8, backend="keras", motion_gate=None, rois=None, result_timeout=5.0, max_backoff=30.0, factory=buat_detector):
+        self.config = {
+            "model_path": model_path,
+            "labels_path": labels_path,
+            "confidence_threshold": confidence_threshold,
+            "backend": backend,
+            "motion_gate": motion_gate,  # dict settings "motion_gate", dibuat di proses detector
+            "rois": rois or [],
+        }
+        self.factory = factory
+        self.confidence_threshold = confidence_threshold
+        self.stable = StableTracker(confidence_threshold)
+        self.result_timeout = result_timeout
+        self.max_backoff = max_backoff
+        self.shared = None  # dibuat dari ukuran frame pertama
+        self.backend = _RemoteBackendStats()
+        self.motion_gate = _RemoteGateStats() if (motion_gate or {}).get("enabled") else None
+        self.startup_times = {}
+        self.restarts = 0
+        self.load_error = None
+
+        self._ctx = mp.get_context("spawn")  # jangan fork proses yang sudah punya thread
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._seq = 0
+        self._pending = None  # seq frame yang sedang ditunggu
+        self._result = None
+        self._result_ready = threading.Event()
+        self.process = None
+        self._spawn()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def _spawn(self):
+        self._ready.clear()
+        self.requests = self._ctx.Queue()
+        self.results = self._ctx.Queue()
+        buffer_info = (self.shared.name, self.shared.shape) if self.shared is not None else None
+        self.process = self._ctx.Process(target=_worker_main, args=(self.factory, self.config, buffer_info, self.requests, self.results), daemon=True)
+        self.process.start()
+        threading.Thread(target=self._read_results, args=(self.results,), daemon=True).start()
+
+    def _read_results(self, results):
+        """Satu-satunya pembaca `results`; berhenti saat proses diganti (antrian baru) atau stop."""
+        while not self._stopped.is_set() and results is self.results:
+            try:
+                msg = results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if msg[0] == "ready":
+                self.backend.name = f"{msg[1]}@proses"
+                self.startup_times = msg[2]
+                self._ready.set()
+            elif msg[0] == "error":
+                self.load_error = msg[1]
+            elif msg[0] == "result" and msg[1] == self._pending:
+                # Jawaban lama dari sebelum timeout diabaikan
+                self._result = msg
+                self._result_ready.set()
+
+    def wait_ready(self, timeout=None):
+        """Tunggu model selesai dimuat di proses detector."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready.wait(0.5):
+            if self.load_error is not None or self._stopped.is_set() or (deadline is not None and time.monotonic() > deadline):
+                return False
+        return True
+
+    def warmup(self, runs=2):
+        # Warmup sudah dilakukan di proses detector
+        if not self.wait_ready() and self.load_error is not None:
+            self.stop()
+            raise RuntimeError(self.load_error)
+
+    def report_startup(self):
+        for phase, seconds in self.startup_times.items():
+            print(f"⏱️ {phase:<12} {seconds * 1000:8.1f} ms (proses detector)")
+
+    def set_rois(self, rois):
+        self.config["rois"] = rois or []
+        self.requests.put(("rois", self.config["rois"]))
+
+    def _ensure_buffer(self, frame):
+        """Buffer mengikuti ukuran frame; frame berubah ukuran -> buffer baru, bukan resize."""
+        if self.shared is not None and self.shared.shape == frame.shape:
+            return
+        old = self.shared
+        if old is not None:
+            print(f"⚠️ Ukuran frame berubah {old.shape} -> {frame.shape}, buffer shared memory dibuat ulang")
+        self.shared = SharedFrame(frame.shape)
+        self.requests.put(("buffer", self.shared.name, self.shared.shape))
+        if old is not None:
+            # Proses detector tetap memetakan segmen lama sampai pesan "buffer" diproses
+            old.close()
+
+    def predict_gated(self, frame):
+        if not self._ready.is_set():
+            return "-", 0.0
+        with self._lock:
+            # Frame sebelumnya sudah dijawab (atau prosesnya dihentikan), jadi buffer bebas ditimpa
+            self._ensure_buffer(frame)
+            self._seq += 1
+            self._pending = self._seq
+            self._result_ready.clear()
+            self.shared.write(frame)
+            self.requests.put(("frame", self._seq))
+            return self._wait_result()
+
+    def _wait_result(self):
+        if not self._result_ready.wait(self.result_timeout):
+            # Proses macet: hentikan, watchdog yang menyalakan ulang
+            print(f"⚠️ Detector tidak menjawab dalam {self.result_timeout:.1f} s")
+            self._pending = None
+            self._ready.clear()
+            if self.process.is_alive():
+                self.process.terminate()
+            return "-", 0.0
+        _, _, label, conf, inferred, latency = self._result
+        self._pending = None
+        if self.motion_gate is not None:
+            self.motion_gate.checked += 1
+            self.motion_gate.skipped += not inferred
+        if inferred:
+            self.backend.calls += 1
+            self.backend.last_latency = latency
+            self.backend.total_latency += latency
+        return label, conf
+
+    def stable_detect(self, frame, now):
+        with metrics.timer("remote_detect"):
+            label, conf = self.predict_gated(frame)
+        return label, conf, self.stable.update(conf, now)
+
+    def _restart(self):
+        self._ready.clear()
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=2.0)
+        self.restarts += 1
+        self._spawn()
+
+    def _watch(self):
+        backoff = 1.0
+        while not self._stopped.wait(0.5):
+            if self.process.is_alive():
+                if self._ready.is_set():
+                    backoff = 1.0
+                continue
+            if self._stopped.is_set() or self.load_error is not None:
+                return
+            print(f"⚠️ Proses detector mati (exit {self.process.exitcode}), dinyalakan ulang dalam {backoff:.1f} s")
+            if self._stopped.wait(backoff) or self.load_error is not None:
+                return
+            backoff = min(backoff * 2, self.max_backoff)
+            with self._lock:
+                self._restart()
+
+    def stop(self):
+        self._stopped.set()
+        self._watchdog.join(timeout=2.0)
+        if self.process is not None and self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.shared is not None:
+            self.shared.close()
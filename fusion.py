@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class SortFusion:
+    """Pasangkan event deteksi (kamera) dengan event berat (timbangan) berdasarkan waktu.
+
+    Ikan yang terdeteksi di kamera pada `ts` diharapkan sampai di timbangan pada
+    `ts + offset`. Event berat dalam rentang +/- `window` detik dari waktu itu
+    dipasangkan secara FIFO (urutan di conveyor tidak berubah). Pasangan lengkap
+    masuk ke `events` dan diproses `on_event` di thread fusion. Event yang tidak
+    mendapat pasangan dibuang dan dihitung.
+    """
+
+    def __init__(self, offset=1.5, window=0.75, grace=0.5, on_event=None):
+        self.offset = offset
+        self.window = window
+        self.grace = grace  # toleransi keterlambatan inferensi/serial
+        self.on_event = on_event
+        self.lock = threading.Lock()
+        self.detections = deque()
+        self.weights = deque()
+        self.events = queue.Queue()
+
+        self.paired = 0
+        self.unmatched_detections = 0
+        self.unmatched_weights = 0
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def add_detection(self, ts, label, conf):
+        with self.lock:
+            self.detections.append((ts, label, float(conf)))
+            self._match()
+
+    def add_weight(self, ts, berat):
+        with self.lock:
+            self.weights.append((ts, float(berat)))
+            self._match()
+
+    def _match(self):
+        while self.detections and self.weights:
+            d_ts, label, conf = self.detections[0]
+            w_ts, berat = self.weights[0]
+            expected = d_ts + self.offset
+            if w_ts < expected - self.window:
+                self.weights.popleft()
+                self.unmatched_weights += 1
+            elif w_ts > expected + self.window:
+                self.detections.popleft()
+                self.unmatched_detections += 1
+            else:
+                self.detections.popleft()
+                self.weights.popleft()
+                self.paired += 1
+                self.events.put({"ts": d_ts, "label": label, "conf": conf, "berat": berat, "ts_berat": w_ts})
+
+    def expire(self, now=None):
+        """Buang event yang sudah tidak mungkin mendapat pasangan."""
+        now = time.time() if now is None else now
+        with self.lock:
+            while self.detections and now > self.detections[0][0] + self.offset + self.window + self.grace:
+                self.detections.popleft()
+                self.unmatched_detections += 1
+            while self.weights and now > self.weights[0][0] - self.offset + self.window + self.grace:
+                self.weights.popleft()
+                self.unmatched_weights += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Hentikan thread setelah pasangan yang sudah antri selesai diproses."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                event = self.events.get(timeout=0.1)
+            except queue.Empty:
+                self.expire()
+                continue
+            self._handle(event)
+        # Ikan yang sudah dipasangkan tetap dicatat walau sistem dihentikan
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            self._handle(event)
+
+    def _handle(self, event):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event)
+        except Exception as e:
+            # Satu event gagal (mis. error DB/log) tidak boleh mematikan thread fusion
+            self.errors += 1
+            print(f"❌ Gagal memproses event sortir {event.get('label')} {event.get('berat')}: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "paired": self.paired,
+                "unmatched_detections": self.unmatched_detections,
+                "unmatched_weights": self.unmatched_weights,
+                "errors": self.errors,
+                "pending_detections": len(self.detections),
+                "pending_weights": len(self.weights),
+            }
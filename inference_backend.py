@@ -0,0 +1,198 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+
+# TensorFlow sengaja di-import di dalam fungsi: import-nya saja butuh beberapa
+# detik, padahal jalur TFLite dari cache tidak memerlukannya sama sekali.
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data/cache")
+
+
+def _tflite_interpreter_class():
+    try:
+        # Di Raspberry biasanya cukup tflite_runtime tanpa TensorFlow penuh
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class InferenceBackend:
+    """Dasar semua engine inferensi: `predict(batch)` + catatan latensi per panggilan."""
+
+    name = "base"
+
+    def __init__(self):
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.calls = 0
+
+    def predict(self, batch):
+        t0 = time.perf_counter()
+        output = self._run(batch)
+        self.last_latency = time.perf_counter() - t0
+        self.total_latency += self.last_latency
+        self.calls += 1
+        return output
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def input_buffer(self, batch_size=1):
+        """View ke tensor input engine jika bisa ditulis langsung, selain itu None."""
+        return None
+
+    @property
+    def avg_latency(self):
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    def latency_report(self):
+        return {
+            "backend": self.name,
+            "calls": self.calls,
+            "last_ms": self.last_latency * 1000,
+            "avg_ms": self.avg_latency * 1000,
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """Jalur lama: `model.predict`, overhead besar per panggilan."""
+
+    name = "keras"
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def _run(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class CompiledBackend(InferenceBackend):
+    """Panggilan model langsung yang dikompilasi menjadi graph lewat tf.function."""
+
+    name = "compiled"
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        super().__init__()
+        self.model = model
+        self._constant = tf.constant
+        _, h, w, c = model.input_shape
+        spec = tf.TensorSpec(shape=[None, h, w, c], dtype=tf.float32)
+        self._fn = tf.function(lambda x: model(x, training=False), input_signature=[spec])
+
+    def _run(self, batch):
+        return self._fn(self._constant(batch)).numpy()
+
+
+class TFLiteBackend(InferenceBackend):
+    """Interpreter TFLite dari file .tflite (hasil konversi keras_model.h5)."""
+
+    name = "tflite"
+
+    def __init__(self, tflite_path, num_threads=None):
+        super().__init__()
+        self.tflite_path = tflite_path
+        self.interpreter = _tflite_interpreter_class()(model_path=tflite_path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+
+    def _ensure_batch(self, batch_size):
+        # Model TFLite dibuat dengan batch 1; ubah ukuran tensor untuk batch lane
+        if self.input_detail["shape"][0] == batch_size:
+            return
+        _, h, w, c = self.input_detail["shape"]
+        self.interpreter.resize_tensor_input(self.input_detail["index"], [batch_size, h, w, c])
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+
+    def input_buffer(self, batch_size=1):
+        if self.input_detail["dtype"] != np.float32:
+            return None
+        self._ensure_batch(batch_size)
+        # Jangan simpan view ini melewati invoke() (interpreter akan menolak)
+        return self.interpreter.tensor(self.input_detail["index"])()
+
+    def _run(self, batch):
+        # batch None: input sudah ditulis langsung lewat input_buffer()
+        if batch is not None:
+            self._set_input(batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output_detail["index"])
+        if output.dtype != np.float32:
+            scale, zero_point = self.output_detail["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def _set_input(self, batch):
+        self._ensure_batch(len(batch))
+        detail = self.input_detail
+        if detail["dtype"] != np.float32:
+            # Model INT8 penuh: kuantisasi input sesuai scale/zero_point
+            scale, zero_point = detail["quantization"]
+            info = np.iinfo(detail["dtype"])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            self.interpreter.set_tensor(detail["index"], batch.astype(detail["dtype"]))
+        else:
+            self.interpreter.set_tensor(detail["index"], batch.astype(detail["dtype"], copy=False))
+
+    @property
+    def input_shape(self):
+        _, h, w, _ = self.input_detail["shape"]
+        return (int(h), int(w))
+
+
+def convert_to_tflite(model, tflite_path):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    os.makedirs(os.path.dirname(tflite_path) or ".", exist_ok=True)
+    tmp_path = tflite_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(converter.convert())
+    os.replace(tmp_path, tflite_path)
+    print(f"✅ Model TFLite disimpan: {tflite_path}")
+    return tflite_path
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cached_tflite_path(model_path):
+    """Lokasi cache hasil konversi, dikunci dengan hash isi file .h5."""
+    base = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(CACHE_DIR, f"{base}-{file_hash(model_path)[:16]}.tflite")
+
+
+def buat_backend(nama, model, model_path):
+    """Buat engine sesuai nama di settings.json ("keras", "compiled", "tflite")."""
+    nama = (nama or "keras").lower()
+
+    if model_path.endswith(".tflite"):
+        # Artefak hasil kuantisasi langsung dipakai apa adanya
+        return TFLiteBackend(model_path)
+
+    if nama == "keras":
+        return KerasBackend(model)
+    if nama == "compiled":
+        return CompiledBackend(model)
+    if nama == "tflite":
+        tflite_path = cached_tflite_path(model_path)
+        if not os.path.exists(tflite_path):
+            if model is None:
+                raise FileNotFoundError(f"Cache TFLite belum ada: {tflite_path}")
+            convert_to_tflite(model, tflite_path)
+        return TFLiteBackend(tflite_path)
+
+    raise ValueError(f"Backend inferensi tidak dikenal: {nama}")
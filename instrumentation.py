@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Batas atas bucket histogram (ms); bucket terakhir = di atas 1 detik
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+DUMP_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class Histogram:
+    """Histogram latency dengan bucket tetap: memori konstan, observe O(log n)."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        """Perkiraan persentil: batas atas bucket tempat persentil jatuh."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_ms": self.total,
+            "avg_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets_ms": list(BUCKETS_MS) + ["inf"],
+            "counts": list(self.counts),
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "t0")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Timer per tahap + counter untuk hot path. Saat nonaktif, `timer()` dan
+    `count()` langsung kembali tanpa membaca jam atau mengambil lock."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def timer(self, stage):
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds * 1000)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "since": self.started,
+                "uptime_s": time.time() - self.started,
+                "stages": {stage: hist.to_dict() for stage, hist in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def overlay_lines(self):
+        """Ringkasan singkat untuk ditampilkan di panel kamera."""
+        snap = self.snapshot()
+        lines = [f"{stage:<10} p50 {st['p50_ms']:>6.1f}  p95 {st['p95_ms']:>6.1f} ms  n={st['count']}" for stage, st in sorted(snap["stages"].items())]
+        lines += [f"{name:<16} {value}" for name, value in sorted(snap["counters"].items())]
+        return lines
+
+    def dump(self, path=None):
+        """Tulis snapshot ke file JSON dan kembalikan path-nya."""
+        if path is None:
+            path = os.path.join(DUMP_DIR, f"metrics_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+
+# Instance bersama untuk seluruh proses; diaktifkan dari settings "instrumentation"
+metrics = Metrics()
@@ -0,0 +1,215 @@
+import math
+import numbers
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import BUCKETS_MS, metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    # Counter besar harus tetap utuh (1234567, bukan 1.23457e+06) supaya rate() benar
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def render_families(families):
+    """Family (nama, tipe, help, [(sufiks, labels, nilai), ...]) -> teks format Prometheus."""
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def collect_instrumentation(m=metrics):
+    """Histogram per tahap dan counter dari instrumentation.Metrics."""
+    snap = m.snapshot()
+    samples = []
+    for stage, st in sorted(snap["stages"].items()):
+        cumulative = 0
+        for upper_ms, n in zip(list(BUCKETS_MS) + [None], st["counts"]):
+            cumulative += n
+            le = "+Inf" if upper_ms is None else f"{upper_ms / 1000:g}"
+            samples.append(("_bucket", {"stage": stage, "le": le}, cumulative))
+        samples.append(("_sum", {"stage": stage}, st["sum_ms"] / 1000))
+        samples.append(("_count", {"stage": stage}, st["count"]))
+    families = [("fish_stage_latency_seconds", "histogram", "Latency per tahap pipeline.", samples)]
+    for name, value in sorted(snap["counters"].items()):
+        families.append((f"fish_{name}_total", "counter", f"Counter instrumentasi {name}.", [("", {}, value)]))
+    return families
+
+
+class PipelineCollector:
+    """Baca state pipeline (detector, worker, fusion, throughput, db sync) saat di-scrape.
+
+    Atribut boleh None dan diisi belakangan (mis. detector selesai dimuat di background).
+    """
+
+    def __init__(self, detector=None, worker=None, fusion=None, throughput=None, db_sync=None, queues=None):
+        self.detector = detector
+        self.worker = worker
+        self.fusion = fusion
+        self.throughput = throughput
+        self.db_sync = db_sync
+        self.queues = queues or {}
+        self._last_calls = None  # (waktu, jumlah inferensi) scrape sebelumnya
+        self._fps = 0.0
+
+    def _inference_fps(self, calls, now):
+        if self._last_calls is not None and now - self._last_calls[0] >= 1.0:
+            self._fps = (calls - self._last_calls[1]) / (now - self._last_calls[0])
+            self._last_calls = (now, calls)
+        elif self._last_calls is None:
+            self._last_calls = (now, calls)
+        return self._fps
+
+    def __call__(self):
+        families = []
+        now = time.monotonic()
+
+        backend = getattr(self.detector, "backend", None)
+        if backend is not None:
+            families.append(("fish_inference_fps", "gauge", "Laju inferensi (panggilan/detik) sejak scrape sebelumnya.", [("", {"backend": backend.name}, self._inference_fps(backend.calls, now))]))
+            families.append(("fish_inference_calls_total", "counter", "Jumlah panggilan inferensi.", [("", {"backend": backend.name}, backend.calls)]))
+            families.append(("fish_inference_latency_seconds", "gauge", "Latency inferensi terakhir dan rata-rata.", [
+                ("", {"stat": "last"}, backend.last_latency),
+                ("", {"stat": "avg"}, backend.avg_latency),
+            ]))
+
+        gate = getattr(self.detector, "motion_gate", None)
+        if gate is not None:
+            families.append(("fish_motion_gate_frames_total", "counter", "Frame yang diperiksa motion gate; skipped = tidak diinferensi.", [("", {"status": key}, n) for key, n in gate.stats().items()]))
+
+        stream = getattr(self.worker, "stream", None)
+        if stream is not None:
+            stats = stream.stats()
+            families.append(("fish_camera_frames_total", "counter", "Frame kamera per status.", [("", {"status": key}, stats[key]) for key in ("captured", "dropped", "duplicate")]))
+            families.append(("fish_camera_reconnects_total", "counter", "Jumlah sambung ulang kamera.", [("", {}, stats["reconnects"])]))
+
+        depths = [("", {"queue": name}, q.qsize()) for name, q in self.queues.items()]
+        if self.worker is not None:
+            depths.append(("", {"queue": "detection_results"}, self.worker.results.qsize()))
+        if self.fusion is not None:
+            fusion_stats = self.fusion.stats()
+            depths.append(("", {"queue": "fusion_events"}, self.fusion.events.qsize()))
+            depths.append(("", {"queue": "fusion_pending_detections"}, fusion_stats["pending_detections"]))
+            depths.append(("", {"queue": "fusion_pending_weights"}, fusion_stats["pending_weights"]))
+            families.append(("fish_fusion_events_total", "counter", "Hasil pemasangan deteksi dengan berat.", [
+                ("", {"hasil": "paired"}, fusion_stats["paired"]),
+                ("", {"hasil": "unmatched_detection"}, fusion_stats["unmatched_detections"]),
+                ("", {"hasil": "unmatched_weight"}, fusion_stats["unmatched_weights"]),
+            ]))
+        if depths:
+            families.append(("fish_queue_depth", "gauge", "Isi antrian internal.", depths))
+
+        if self.throughput is not None:
+            box_pcs, jenis_pcs = self.throughput.counts()
+            families.append(("fish_sorted_by_box_total", "counter", "Ikan tersortir per box sejak start.", [("", {"box": box}, n) for box, n in sorted(box_pcs.items())]))
+            families.append(("fish_sorted_by_species_total", "counter", "Ikan tersortir per jenis sejak start.", [("", {"jenis": jenis}, n) for jenis, n in sorted(jenis_pcs.items())]))
+
+        if self.db_sync is not None:
+            families.append(("fish_db_sync_backlog", "gauge", "Record yang belum terkirim ke database (antrian + spool).", [("", {}, self.db_sync.backlog())]))
+            families.append(("fish_db_sync_online", "gauge", "1 jika database terakhir bisa dihubungi.", [("", {}, int(self.db_sync.online))]))
+            families.append(("fish_db_sync_sent_total", "counter", "Record yang sudah terkirim ke database.", [("", {}, self.db_sync.records_sent)]))
+
+        return families
+
+
+class MetricsServer:
+    """Endpoint HTTP lokal (`/metrics`) dalam format teks Prometheus.
+
+    Hasil render di-cache `min_interval` detik, jadi scrape beruntun atau beberapa
+    scraper sekaligus tidak menambah beban ke thread deteksi.
+    """
+
+    def __init__(self, collectors, host="127.0.0.1", port=9108, min_interval=1.0):
+        self.collectors = list(collectors)
+        self.host = host
+        self.port = port
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self._cache = (0.0, b"")
+        self.httpd = None
+        self.thread = None
+
+    def render(self):
+        with self.lock:
+            rendered_at, body = self._cache
+            now = time.monotonic()
+            if body and now - rendered_at < self.min_interval:
+                return body
+            families = []
+            for collector in self.collectors:
+                try:
+                    families.extend(collector())
+                except Exception as e:
+                    print(f"⚠️ Collector metrik gagal: {e}")
+            body = render_families(families).encode()
+            self._cache = (now, body)
+            return body
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.render()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # jangan spam konsol tiap scrape
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"📈 Endpoint metrik: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+def buat_metrics_server(endpoint_settings, collectors):
+    """Jalankan endpoint dari section "metrics_endpoint"; None jika mati atau port tidak bisa dibuka."""
+    endpoint_settings = endpoint_settings or {}
+    if not endpoint_settings.get("enabled"):
+        return None
+    # Histogram latency (log, timbangan, ...) butuh instrumentasi aktif
+    metrics.enabled = True
+    try:
+        return MetricsServer(collectors, host=endpoint_settings.get("host", "127.0.0.1"), port=endpoint_settings.get("port", 9108)).start()
+    except OSError as e:
+        print(f"⚠️ Endpoint metrik tidak bisa dibuka: {e}")
+        return None
@@ -0,0 +1,330 @@
+"""Mode multi-conveyor: beberapa kamera, satu model.
+
+Tiap lane (kamera + timbangan) punya thread capture, motion gate, state deteksi
+stabil, ROI, SortFusion, counter box dan riwayat log sendiri (kolom "lane"). Frame dari
+semua lane dikumpulkan InferenceServer dan diinferensi dalam satu batch, jadi
+TensorFlow hanya dimuat sekali.
+
+    python multi_stream.py --source lane1=rekaman1.mp4 --source lane2=rekaman2.mp4
+
+Tanpa --source, daftar lane dibaca dari settings.json ("lanes").
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from computer_vision import SimpleDetector, StableTracker, VideoStream, buat_motion_gate
+from db_sync import buat_sync_service
+from fusion import SortFusion
+from instrumentation import metrics
+from metrics_server import buat_metrics_server, collect_instrumentation
+from pipeline import catat_sort_event, jalankan_headless, load_settings, siapkan_detector
+from sensor_timbangan import ScaleReader
+from simulasi.simulasi_sensor_berat import baca_berat
+from throughput import ThroughputAggregator
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class InferenceServer:
+    """Satu detector untuk semua lane.
+
+    Lane mengirim frame lewat `submit`; server menunggu paling lama `max_wait`
+    detik untuk mengumpulkan sampai `batch_size` frame, menjalankan satu
+    inferensi, lalu mengembalikan hasil ke `lane.on_result` masing-masing.
+    """
+
+    def __init__(self, detector, batch_size, max_wait=0.005):
+        self.detector = detector
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def submit(self, lane, frame, ts):
+        self.requests.put((lane, frame, ts))
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def _collect(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                # Ukuran batch tetap = jumlah lane supaya tensor engine tidak dialokasi ulang
+                hasil = self.detector.predict_batch([frame for _, frame, _ in batch], self.batch_size)
+            except Exception as e:
+                # Hanya batch ini yang gagal; lane tetap dilepas supaya tidak menunggu selamanya
+                self.errors += 1
+                print(f"❌ Inferensi batch gagal ({', '.join(lane.name for lane, _, _ in batch)}): {e}")
+                hasil = [("-", 0.0)] * len(batch)
+            self.batches += 1
+            self.frames += len(batch)
+            for (lane, _, ts), (label, conf) in zip(batch, hasil):
+                lane.on_result(ts, label, conf)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch": self.frames / self.batches if self.batches else 0.0,
+            "errors": self.errors,
+        }
+
+
+class Lane:
+    """Satu conveyor: kamera, timbangan (atau simulasi), state stabil, fusion dan counter sendiri."""
+
+    def __init__(self, name, source, server, confidence_threshold=0.8, motion_gate=None, roi=None, fusion_settings=None, scale_settings=None, db_sync=None, listeners=None):
+        self.name = name
+        self.source = source
+        self.server = server
+        self.motion_gate = motion_gate
+        self.roi = tuple(int(v) for v in roi) if roi else None  # [x, y, w, h] belt di frame kamera lane ini
+        self._roi_warned = False
+        self.db_sync = db_sync
+        self.listeners = listeners if listeners is not None else []
+        self.stable = StableTracker(confidence_threshold)
+        self.throughput = ThroughputAggregator()
+        self.data_path = os.path.join(DATA_DIR, f"data_{name}.json")
+
+        fusion_settings = fusion_settings or {}
+        self.fusion = SortFusion(offset=fusion_settings.get("offset", 1.5), window=fusion_settings.get("window", 0.75), on_event=self.simpan_sort_event)
+        scale_settings = dict(scale_settings or {})
+        self.scale_reader = None
+        if scale_settings.get("port"):
+            self.scale_reader = ScaleReader(scale_settings.pop("port"), on_stable=self.fusion.add_weight, **scale_settings)
+
+        self.active = threading.Event()
+        self.stopped = threading.Event()
+        self._done = threading.Event()
+        self.last_result = ("-", 0.0)
+        self.frames_skipped = 0
+        self.detections = 0
+        self.stream = None
+        self.thread = None
+
+    def start(self):
+        self.stream = VideoStream(self.source)
+        self.fusion.start()
+        if self.scale_reader is not None:
+            self.scale_reader.start()
+        self.throughput.start_autosave(self.data_path, interval=10.0)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self._done.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        if self.stream is not None:
+            self.stream.stop()
+        self.fusion.stop()
+        if self.scale_reader is not None:
+            self.scale_reader.stop()
+        self.throughput.stop_autosave(self.data_path)
+
+    def _loop(self):
+        seq = 0
+        while not self.stopped.is_set():
+            seq, frame = self.stream.read_new(seq, timeout=0.5)
+            if frame is None:
+                continue
+            now = time.time()
+            if self.roi is not None:
+                region = SimpleDetector.crop(frame, self.roi)
+                if region is not None:
+                    frame = region
+                elif not self._roi_warned:
+                    self._roi_warned = True
+                    print(f"⚠️ ROI lane {self.name} di luar frame {frame.shape[1]}x{frame.shape[0]}, memakai seluruh frame")
+            if self.motion_gate is not None and not self.motion_gate.check(frame):
+                self.frames_skipped += 1
+                self.on_result(now, "-", 0.0)
+                continue
+            # Satu frame per lane sedang diproses; frame baru menunggu hasilnya
+            self._done.clear()
+            self.server.submit(self, frame, now)
+            self._done.wait(timeout=2.0)
+
+    def on_result(self, ts, label, conf):
+        # Dipanggil dari thread InferenceServer (atau thread lane saat frame dilewati gate)
+        self.last_result = (label, float(conf))
+        if self.stable.update(conf, ts):
+            self.detections += 1
+            metrics.count("detections")
+            if self.active.is_set():
+                self.fusion.add_detection(ts, label, conf)
+                if self.scale_reader is None:
+                    self.fusion.add_weight(ts + self.fusion.offset, baca_berat())
+        self._done.set()
+
+    def simpan_sort_event(self, event):
+        # Dipanggil dari thread SortFusion milik lane ini
+        kirim_db = self.db_sync.enqueue if self.db_sync is not None else None
+        catat_sort_event(event, self.throughput, kirim_db, self.listeners, lane=self.name)
+
+    def status(self):
+        snapshot = self.throughput.snapshot()
+        return {
+            "lane": self.name,
+            "pcs_sorted": snapshot["info_data"]["pcs_sorted"],
+            "kg_sorted": snapshot["info_data"]["kg_sorted"],
+            "pcs_per_hour": snapshot["info_data"]["pcs_per_hour"],
+            "box_manager": snapshot["box_manager"],
+            "detections": self.detections,
+            "frames_skipped": self.frames_skipped,
+            "camera": self.stream.stats() if self.stream is not None else None,
+            "fusion": self.fusion.stats(),
+        }
+
+
+class MultiStreamPipeline:
+    """Beberapa Lane yang berbagi satu SimpleDetector lewat InferenceServer."""
+
+    def __init__(self, settings, lanes, detector=None):
+        self.settings = settings
+        self.listeners = []
+        if detector is None:
+            detector = siapkan_detector(settings, multi_lane=True)
+        self.detector = detector
+        self.server = InferenceServer(detector, batch_size=len(lanes))
+        self.db_sync = buat_sync_service(settings.get("database"))
+
+        self.lanes = []
+        for lane in lanes:
+            self.lanes.append(Lane(
+                lane["name"], lane["source"], self.server,
+                confidence_threshold=detector.confidence_threshold,
+                # Background motion gate berbeda per kamera
+                motion_gate=buat_motion_gate(settings.get("motion_gate")),
+                roi=lane.get("roi"),
+                fusion_settings=lane.get("fusion", settings.get("fusion")),
+                scale_settings=lane.get("scale"),
+                db_sync=self.db_sync,
+                listeners=self.listeners,
+            ))
+
+        self.metrics_server = buat_metrics_server(settings.get("metrics_endpoint"), [collect_instrumentation, self.collect_lanes])
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def start(self):
+        if self.db_sync is not None:
+            self.db_sync.start()
+        self.server.start()
+        for lane in self.lanes:
+            lane.start()
+        return self
+
+    def set_active(self, aktif):
+        for lane in self.lanes:
+            if aktif:
+                lane.active.set()
+            else:
+                lane.active.clear()
+
+    def stop(self):
+        for lane in self.lanes:
+            lane.stop()
+        self.server.stop()
+        if self.db_sync is not None:
+            self.db_sync.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+    def status(self):
+        return {"inference": self.server.stats(), "lanes": [lane.status() for lane in self.lanes]}
+
+    def collect_lanes(self):
+        sorted_samples, frame_samples, queue_samples = [], [], []
+        for lane in self.lanes:
+            box_pcs, _ = lane.throughput.counts()
+            sorted_samples += [("", {"lane": lane.name, "box": box}, n) for box, n in sorted(box_pcs.items())]
+            frame_samples.append(("", {"lane": lane.name, "status": "skipped"}, lane.frames_skipped))
+            if lane.stream is not None:
+                stats = lane.stream.stats()
+                frame_samples += [("", {"lane": lane.name, "status": key}, stats[key]) for key in ("captured", "dropped")]
+            queue_samples.append(("", {"queue": f"fusion_events_{lane.name}"}, lane.fusion.events.qsize()))
+        queue_samples.append(("", {"queue": "inference_requests"}, self.server.requests.qsize()))
+        families = [
+            ("fish_lane_sorted_total", "counter", "Ikan tersortir per lane dan box.", sorted_samples),
+            ("fish_lane_frames_total", "counter", "Frame kamera per lane dan status.", frame_samples),
+            ("fish_queue_depth", "gauge", "Isi antrian internal.", queue_samples),
+            ("fish_inference_batches_total", "counter", "Jumlah batch inferensi bersama.", [("", {}, self.server.batches)]),
+        ]
+        if self.db_sync is not None:
+            families.append(("fish_db_sync_backlog", "gauge", "Record yang belum terkirim ke database (antrian + spool).", [("", {}, self.db_sync.backlog())]))
+        return families
+
+
+def parse_sources(values):
+    """["lane1=rtsp://...", "video.mp4", "0"] -> [{"name", "source"}, ...]"""
+    lanes = []
+    for i, value in enumerate(values, 1):
+        name, sep, source = value.partition("=")
+        if not sep:
+            name, source = f"lane{i}", value
+        lanes.append({"name": name, "source": int(source) if source.isdigit() else source})
+    return lanes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sortir beberapa conveyor dengan satu model")
+    parser.add_argument("--source", action="append", default=[], help="[nama=]kamera/URL/video, boleh berulang")
+    parser.add_argument("--settings", default=os.path.join(DATA_DIR, "settings.json"))
+    parser.add_argument("--status-interval", type=float, default=30.0)
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    lanes = parse_sources(args.source) if args.source else settings.get("lanes", [])
+    if not lanes:
+        parser.error("tidak ada lane: pakai --source atau isi \"lanes\" di settings.json")
+
+    pipeline = MultiStreamPipeline(settings, lanes)
+
+    def cetak_keputusan(event):
+        print(json.dumps({"waktu": datetime.fromtimestamp(event["ts"]).isoformat(timespec="milliseconds"), "lane": event["lane"], "jenis": event["label"], "berat": event["berat"], "box": event["box"]}), flush=True)
+
+    pipeline.add_listener(cetak_keputusan)
+
+    jalankan_headless(pipeline, args.status_interval, f"{len(lanes)} lane")
+
+if __name__ == "__main__":
+    main()
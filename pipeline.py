@@ -0,0 +1,301 @@
+"""Pipeline sortir tanpa GUI: capture -> deteksi -> timbang -> klasifikasi -> log.
+
+Modul ini tidak mengimpor Tk/PIL sama sekali. ui-design.py hanyalah klien yang
+menempel ke SortingPipeline; tanpa layar jalankan langsung:
+
+    python pipeline.py --source rtsp://127.0.0.1:8554/mystream
+
+Keputusan sortir dicetak sebagai JSON per baris (stdout), metrik lewat endpoint
+Prometheus ("metrics_endpoint" di settings.json).
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from backend_log import log_system_activity, simpan_log_deteksi
+from box_classifier import perbarui_classifier
+from computer_vision import SimpleDetector, buat_motion_gate
+from db_sync import buat_record, buat_sync_service
+from detection_worker import DetectionWorker
+from detector_process import RemoteDetector
+from fusion import SortFusion
+from metrics_server import PipelineCollector, buat_metrics_server, collect_instrumentation
+from sensor_timbangan import ScaleReader
+from settings_store import SETTINGS_FILE, load_settings
+from simulasi.simulasi_sensor_berat import baca_berat
+from throughput import DATA_FILE, ThroughputAggregator
+
+def load_json_data(path=DATA_FILE):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File data.json tidak ditemukan di: {path}")
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Gagal memuat data.json: {e}")
+
+
+def siapkan_detector(settings, multi_lane=False):
+    """Detector dari section "inference" (+ "motion_gate"/"roi"), sudah di-warmup.
+
+    Mode `multi_lane` (multi_stream.py) butuh `predict_batch` di proses ini; motion
+    gate dan ROI dipasang per lane, bukan di detector.
+    """
+    inference_settings = settings.get("inference", {})
+    model_path = inference_settings.get("model", "data/keras_model.h5")
+    backend = inference_settings.get("backend", "keras")
+    if multi_lane:
+        if inference_settings.get("process"):
+            print("⚠️ inference.process belum didukung mode multi-lane; inferensi tetap di proses ini")
+        detector = SimpleDetector(model_path, "data/labels.txt", confidence_threshold=0.8, backend=backend)
+    elif inference_settings.get("process"):
+        # Inferensi di proses terpisah, frame lewat shared memory
+        detector = RemoteDetector(model_path, "data/labels.txt", confidence_threshold=0.8, backend=backend, motion_gate=settings.get("motion_gate"), rois=settings.get("roi", []))
+    else:
+        detector = SimpleDetector(model_path, "data/labels.txt", confidence_threshold=0.8, backend=backend, motion_gate=buat_motion_gate(settings.get("motion_gate")), rois=settings.get("roi", []))
+    detector.warmup()
+    detector.report_startup()
+    return detector
+
+
+def catat_sort_event(event, throughput, kirim_db=None, listeners=(), lane=None):
+    """Satu keputusan sortir dari SortFusion: log, counter box, database, lalu klien.
+
+    `event` dilengkapi berat dibulatkan, "box" dan (mode multi-lane) "lane" sebelum
+    diteruskan ke tiap `fn(event)` di `listeners`.
+    """
+    event["berat"] = round(event["berat"], 3)
+    if lane is not None:
+        event["lane"] = lane
+    event["box"] = simpan_log_deteksi(event["label"], event["berat"], lane=lane)
+    throughput.add(event["label"], event["berat"], event["box"])
+    if kirim_db is not None:
+        kirim_db(buat_record(event["label"], event["berat"], event["box"], lane=lane))
+    for fn in listeners:
+        try:
+            fn(event)
+        except Exception as e:
+            # Klien yang error tidak boleh menghentikan sortir untuk klien lain
+            print(f"⚠️ Listener sortir gagal: {e}")
+    return event["box"]
+
+
+def jalankan_headless(pipeline, status_interval, keterangan):
+    """Loop CLI bersama: jalan sampai SIGTERM/SIGINT, cetak status tiap `status_interval` detik."""
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+
+    failed = getattr(pipeline, "failed", None)
+    pipeline.start()
+    pipeline.set_active(True)
+    log_system_activity(f"Sistem dimulai ({keterangan}).")
+    next_status = time.monotonic() + status_interval
+    while not stopped.wait(0.5):
+        if failed is not None and failed.is_set():
+            sys.exit(1)
+        if status_interval and time.monotonic() >= next_status:
+            next_status += status_interval
+            print(f"📊 {json.dumps(pipeline.status())}", flush=True)
+
+    pipeline.set_active(False)
+    pipeline.stop()
+    log_system_activity(f"Sistem dihentikan ({keterangan}).")
+
+
+class SortingPipeline:
+    """Semua bagian non-UI dari sistem sortir dalam satu objek.
+
+    Klien (GUI, CLI) mendaftar lewat `add_listener(fn)`; `fn(event)` dipanggil dari
+    thread fusion untuk tiap keputusan sortir (event berisi label, berat, box).
+    Dengan `draw_overlay=False` frame tidak diberi teks dan tidak disimpan untuk preview.
+    Jika diberi `store` (SettingsStore), perubahan ROI, database dan aturan box diterapkan langsung.
+    """
+
+    def __init__(self, settings=None, source=0, draw_overlay=True, store=None):
+        if store is not None:
+            settings = store.data
+            store.subscribe("roi", self.set_rois)
+            store.subscribe("database", self.restart_db_sync)
+            store.subscribe("conveyor", self.set_conveyor)
+            # Aturan box berlaku langsung, tanpa menunggu settings.json ditulis
+            store.subscribe("klasifikasi", lambda _: perbarui_classifier(store.data))
+            store.subscribe("range", lambda _: perbarui_classifier(store.data))
+        self.settings = settings if settings is not None else load_settings()
+        self.conveyor = dict(self.settings.get("conveyor", {}))
+        self.startup_t0 = time.perf_counter()
+        self.listeners = []
+        self.detector = None
+        self.load_error = None
+        self.failed = threading.Event()  # model gagal dimuat, pipeline sudah dihentikan
+        self._stopped = False
+
+        self.throughput = ThroughputAggregator()
+        try:
+            self.throughput.load(load_json_data())
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️ {e}")
+
+        self.db_sync = None
+        self._db_lock = threading.Lock()  # satu restart sinkronisasi pada satu waktu
+        self._db_swap_lock = threading.Lock()  # tukar referensi db_sync / record selama restart
+        self._db_pending = None
+        fusion_settings = self.settings.get("fusion", {})
+        self.fusion = SortFusion(offset=fusion_settings.get("offset", 1.5), window=fusion_settings.get("window", 0.75), on_event=self.simpan_sort_event)
+        self.scale_reader = None
+        scale_settings = dict(self.settings.get("scale", {}))
+        if scale_settings.get("port"):
+            self.scale_reader = ScaleReader(scale_settings.pop("port"), on_stable=self.fusion.add_weight, **scale_settings)
+        self.detection_worker = DetectionWorker(None, source, on_detection=self.on_stable_detection, draw_overlay=draw_overlay)
+
+        self.metrics_collector = PipelineCollector(worker=self.detection_worker, fusion=self.fusion, throughput=self.throughput)
+        self.metrics_server = buat_metrics_server(self.settings.get("metrics_endpoint"), [collect_instrumentation, self.metrics_collector])
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def start(self, load_async=True):
+        """Jalankan semua thread; model dimuat di background kecuali `load_async=False`."""
+        self.throughput.start_autosave(interval=10.0)
+        self._restart_db_sync(self.settings.get("database"))
+        self.fusion.start()
+        if self.scale_reader is not None:
+            self.scale_reader.start()
+        self.detection_worker.start()
+        if load_async:
+            threading.Thread(target=self.load_detector, daemon=True).start()
+        else:
+            self.load_detector()
+        return self
+
+    def load_detector(self):
+        try:
+            detector = siapkan_detector(self.settings)
+        except Exception as e:
+            # Tanpa model tidak ada yang bisa disortir: laporkan dan hentikan pipeline
+            self.load_error = str(e)
+            print(f"❌ Model gagal dimuat, pipeline dihentikan: {e}")
+            log_system_activity(f"Model gagal dimuat: {e}")
+            self.stop()
+            self.failed.set()
+            return
+        self.detector = detector
+        self.detection_worker.set_detector(detector)
+        self.metrics_collector.detector = detector
+        print(f"✅ Sistem siap dalam {(time.perf_counter() - self.startup_t0):.2f} s")
+
+    def set_active(self, aktif):
+        self.detection_worker.set_active(aktif)
+
+    def set_rois(self, rois):
+        if self.detector is not None:
+            self.detector.set_rois(rois)
+
+    def set_conveyor(self, speeds):
+        # Kecepatan conveyor terbaru; driver conveyor membaca dari sini, bukan dari file
+        self.conveyor = dict(speeds)
+
+    def restart_db_sync(self, db_settings):
+        # Dipanggil dari pelanggan settings di thread UI; menghentikan service lama bisa lama
+        threading.Thread(target=self._restart_db_sync, args=(dict(db_settings or {}),), daemon=True).start()
+
+    def _restart_db_sync(self, db_settings):
+        with self._db_lock:
+            with self._db_swap_lock:
+                old, self.db_sync = self.db_sync, None
+                self._db_pending = []  # record selama restart, diteruskan ke service baru
+            if old is not None:
+                # Tunggu thread lama benar-benar selesai sebelum spool yang sama dibuka lagi
+                old.stop(timeout=None)
+                old.spool.close()
+            new = buat_sync_service(db_settings)
+            if new is not None:
+                new.start()
+            with self._db_swap_lock:
+                if new is not None:
+                    for record in self._db_pending:
+                        new.enqueue(record)
+                self.db_sync = new
+                self._db_pending = None
+            self.metrics_collector.db_sync = new
+
+    def kirim_db(self, record):
+        # Selama restart sinkronisasi record ditahan dulu, lalu diteruskan ke service baru
+        with self._db_swap_lock:
+            if self.db_sync is not None:
+                self.db_sync.enqueue(record)
+            elif self._db_pending is not None:
+                self._db_pending.append(record)
+
+    def on_stable_detection(self, ts, label, conf):
+        # Dipanggil dari thread DetectionWorker
+        self.fusion.add_detection(ts, label, conf)
+        if self.scale_reader is None:
+            # Mode simulasi: berat acak seolah ditimbang `offset` detik kemudian
+            self.fusion.add_weight(ts + self.fusion.offset, baca_berat())
+
+    def simpan_sort_event(self, event):
+        # Dipanggil dari thread SortFusion
+        catat_sort_event(event, self.throughput, self.kirim_db, self.listeners)
+
+    def status(self):
+        """Ringkasan untuk klien/log: throughput, inferensi, backlog."""
+        info = self.throughput.snapshot()["info_data"]
+        backend = getattr(self.detector, "backend", None)
+        return {
+            "load_error": self.load_error,
+            "pcs_sorted": info["pcs_sorted"],
+            "kg_sorted": info["kg_sorted"],
+            "pcs_per_hour": info["pcs_per_hour"],
+            "inference_calls": backend.calls if backend else 0,
+            "inference_avg_ms": backend.avg_latency * 1000 if backend else 0.0,
+            "fusion": self.fusion.stats(),
+            "db_backlog": self.db_sync.backlog() if self.db_sync is not None else 0,
+            "conveyor": self.conveyor,
+        }
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.detection_worker.stop()
+        if isinstance(self.detector, RemoteDetector):
+            self.detector.stop()
+        self.fusion.stop()
+        self.throughput.stop_autosave()
+        if self.scale_reader is not None:
+            self.scale_reader.stop()
+        with self._db_lock:
+            if self.db_sync is not None:
+                self.db_sync.stop()
+                if not self.db_sync.thread.is_alive():
+                    self.db_sync.spool.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline sortir ikan tanpa GUI")
+    parser.add_argument("--source", default="0", help="indeks kamera, URL RTSP, atau file video")
+    parser.add_argument("--settings", default=SETTINGS_FILE)
+    parser.add_argument("--status-interval", type=float, default=30.0, help="detik antar ringkasan status (0 = mati)")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    pipeline = SortingPipeline(load_settings(args.settings), source=source, draw_overlay=False)
+
+    def cetak_keputusan(event):
+        print(json.dumps({"waktu": datetime.fromtimestamp(event["ts"]).isoformat(timespec="milliseconds"), "jenis": event["label"], "berat": event["berat"], "box": event["box"], "conf": round(event["conf"], 3)}), flush=True)
+
+    pipeline.add_listener(cetak_keputusan)
+
+    jalankan_headless(pipeline, args.status_interval, "headless")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Preview kamera untuk UI, terpisah dari laju capture/inferensi.
+
+Satu PhotoImage dipakai terus (diisi ulang dengan `paste`), frame diperkecil
+dengan OpenCV ke buffer yang sama, dan laju render dibatasi `fps`. Saat jendela
+diminimize/tersembunyi tidak ada yang dirender.
+"""
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from instrumentation import metrics
+
+DEFAULT_FPS = 15
+
+
+class PreviewRenderer:
+    """Render frame terbaru dari `source()` -> (seq, frame BGR) ke label Tk `widget`."""
+
+    def __init__(self, widget, source, size=(533, 400), fps=DEFAULT_FPS):
+        self.widget = widget
+        self.source = source
+        self.size = tuple(size)
+        try:
+            fps = float(fps)
+        except (TypeError, ValueError):
+            fps = 0
+        if not fps > 0:
+            print(f"⚠️ preview fps tidak valid ({fps}), memakai {DEFAULT_FPS}")
+            fps = DEFAULT_FPS
+        self.interval_ms = max(1, int(1000 / fps))
+        w, h = self.size
+        self._small = np.empty((h, w, 3), dtype=np.uint8)
+        self._rgb = np.empty((h, w, 3), dtype=np.uint8)
+        self.photo = ImageTk.PhotoImage("RGB", self.size)
+        self.last_seq = 0
+        self.skipped_hidden = 0
+        self._job = None
+
+    def visible(self):
+        top = self.widget.winfo_toplevel()
+        return bool(self.widget.winfo_viewable()) and top.state() not in ("iconic", "withdrawn")
+
+    def render(self):
+        """Render satu frame jika ada yang baru; kembalikan True jika dirender."""
+        seq, frame = self.source()
+        if frame is None or seq == self.last_seq:
+            return False
+        self.last_seq = seq
+        with metrics.timer("render"):
+            cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            self.photo.paste(Image.fromarray(self._rgb))
+        metrics.count("frames_rendered")
+        return True
+
+    def _tick(self):
+        if self.visible():
+            self.render()
+        else:
+            self.skipped_hidden += 1
+        self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def start(self):
+        self.widget.configure(image=self.photo)
+        self._tick()
+        return self
+
+    def stop(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
@@ -0,0 +1,127 @@
+"""Ekspor varian terkuantisasi dari keras_model.h5 dan bandingkan kecepatan vs akurasi.
+
+Contoh:
+    python quantize_model.py --calib rekaman/ --out data/
+    python quantize_model.py --calib rekaman.mp4 --limit 300
+
+Hasilnya (mis. data/keras_model_int8.tflite) bisa langsung dipakai SimpleDetector
+dengan mengisi "inference": {"model": ...} di settings.json.
+"""
+import argparse
+import glob
+import os
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from computer_vision import SimpleDetector
+from inference_backend import CompiledBackend, TFLiteBackend
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+VARIANTS = ("dynamic", "float16", "int8")
+
+
+def load_calibration_frames(source, limit=200):
+    """Ambil frame BGR dari folder gambar atau file video rekaman."""
+    frames = []
+    if os.path.isdir(source):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(IMAGE_EXTS))
+        for path in paths[:limit]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+
+    if not frames:
+        raise ValueError(f"Tidak ada frame kalibrasi di: {source}")
+    return frames
+
+
+def convert_variant(model, variant, calib_batches):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        def representative_dataset():
+            for batch in calib_batches:
+                yield [batch]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif variant != "dynamic":
+        raise ValueError(f"Varian kuantisasi tidak dikenal: {variant}")
+
+    return converter.convert()
+
+
+def evaluate(backend, batches, reference_top1):
+    """Jalankan semua batch, kembalikan (predictions_top1, agreement, avg_ms, p95_ms)."""
+    top1 = []
+    latencies = []
+    for batch in batches:
+        output = backend.predict(batch)
+        latencies.append(backend.last_latency * 1000)
+        top1.append(int(np.argmax(output[0])))
+
+    top1 = np.array(top1)
+    agreement = float(np.mean(top1 == reference_top1)) if reference_top1 is not None else 1.0
+    return top1, agreement, float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kuantisasi keras_model.h5 ke TFLite")
+    parser.add_argument("--model", default="data/keras_model.h5")
+    parser.add_argument("--labels", default="data/labels.txt")
+    parser.add_argument("--calib", required=True, help="folder gambar atau file video rekaman")
+    parser.add_argument("--limit", type=int, default=200, help="jumlah frame kalibrasi maksimum")
+    parser.add_argument("--out", default="data")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    args = parser.parse_args()
+
+    detector = SimpleDetector(args.model, args.labels, backend="compiled")
+    frames = load_calibration_frames(args.calib, args.limit)
+    # preprocess() memakai ulang buffer yang sama, jadi perlu di-copy
+    batches = [detector.preprocess(frame).copy() for frame in frames]
+    print(f"📦 {len(batches)} frame kalibrasi dari {args.calib}")
+
+    base = os.path.splitext(os.path.basename(args.model))[0]
+    os.makedirs(args.out, exist_ok=True)
+
+    reference = CompiledBackend(detector.model)
+    ref_top1, _, ref_avg, ref_p95 = evaluate(reference, batches, None)
+    rows = [("float32 (keras)", os.path.getsize(args.model), ref_avg, ref_p95, 1.0)]
+
+    for variant in args.variants:
+        path = os.path.join(args.out, f"{base}_{variant}.tflite")
+        with open(path, "wb") as f:
+            f.write(convert_variant(detector.model, variant, batches))
+        print(f"✅ {variant}: {path}")
+
+        top1, agreement, avg_ms, p95_ms = evaluate(TFLiteBackend(path), batches, ref_top1)
+        rows.append((variant, os.path.getsize(path), avg_ms, p95_ms, agreement))
+
+        for idx in np.unique(ref_top1):
+            mask = ref_top1 == idx
+            per_class = float(np.mean(top1[mask] == idx))
+            print(f"   {detector.class_names[idx]:<12} agreement {per_class:.1%} ({int(mask.sum())} frame)")
+
+    print()
+    print(f"{'Varian':<18}{'Ukuran':>10}{'Avg ms':>10}{'P95 ms':>10}{'Top-1 sama':>13}")
+    for name, size, avg_ms, p95_ms, agreement in rows:
+        print(f"{name:<18}{size / 1024:>8.0f}KB{avg_ms:>10.2f}{p95_ms:>10.2f}{agreement:>13.1%}")
+
+
+if __name__ == "__main__":
+    main()
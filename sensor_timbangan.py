@@ -1,15 +1,163 @@
-import serial
-
-def baca_berat():   
-    ser = serial.Serial('COM7', 9600, timeout=1)
-
-    while True:
-        try:
-            line = ser.readline().decode().strip()
-            if line:
-                print(f"Berat: {line}")
-                return line
-        except KeyboardInterrupt:
-            break
-        
-    return 0.0
\ No newline at end of file
+import re
+import threading
+import time
+from collections import deque
+
+from instrumentation import metrics
+from settings_store import load_settings
+
+DEFAULT_PORT = "/dev/ttyUSB0"  # port lama jika "scale" belum diisi di settings.json
+NUMBER_RE = re.compile(rb"[-+]?\d+(?:\.\d+)?")
+
+
+def parse_berat(line):
+    """Ambil angka pertama dari baris timbangan ("1.23", "ST,GS,+  1.230kg", ...)."""
+    match = NUMBER_RE.search(line)
+    return float(match.group()) if match else None
+
+
+class ScaleReader:
+    """Thread yang memegang port serial timbangan selama aplikasi berjalan.
+
+    Setiap baris diparse menjadi sampel (ts, berat) di ring buffer. Berat dianggap
+    stabil jika `window` sampel terakhir punya simpangan baku <= `tolerance`;
+    setiap kali timbangan masuk kondisi stabil dengan beban >= `min_weight`,
+    satu event stabil dicatat. Pemanggil tidak pernah menunggu port.
+    """
+
+    def __init__(self, port, baudrate=9600, window=8, tolerance=0.01, min_weight=0.05, buffer_size=512, max_backoff=10.0, opener=None, on_stable=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.window = window
+        self.tolerance = tolerance
+        self.min_weight = min_weight
+        self.max_backoff = max_backoff
+        self.opener = opener or self._open_serial
+        self.on_stable = on_stable  # dipanggil (ts, berat) untuk tiap event stabil baru
+
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=buffer_size)
+        self.stable_events = deque(maxlen=buffer_size)
+        self.last_stable = None
+        self._recent = deque(maxlen=window)
+        self._was_stable = False
+        self.lines_read = 0
+        self.parse_errors = 0
+        self.reconnects = 0
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _open_serial(self):
+        import serial
+
+        # Port dibuka sekali saja: membuka ulang me-reset banyak board Arduino
+        return serial.Serial(self.port, self.baudrate, timeout=1)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def _loop(self):
+        backoff = 0.5
+        while not self.stopped.is_set():
+            try:
+                ser = self.opener()
+            except Exception as e:
+                print(f"⚠️ Timbangan {self.port} tidak bisa dibuka ({e}), coba lagi {backoff:.1f} s")
+                if self.stopped.wait(backoff):
+                    return
+                backoff = min(backoff * 2, self.max_backoff)
+                self.reconnects += 1
+                continue
+
+            print(f"⚖️ Timbangan tersambung: {self.port}")
+            backoff = 0.5
+            try:
+                while not self.stopped.is_set():
+                    t0 = time.perf_counter()
+                    line = ser.readline()
+                    if line:
+                        # Timeout tanpa data (belt kosong) tidak dihitung sebagai latency
+                        metrics.observe("scale_read", time.perf_counter() - t0)
+                        self.feed(line)
+            except Exception as e:
+                print(f"⚠️ Timbangan terputus: {e}")
+            finally:
+                ser.close()
+
+    def feed(self, line, ts=None):
+        """Proses satu baris mentah (bytes/str). Dipakai thread serial dan simulasi."""
+        if isinstance(line, str):
+            line = line.encode()
+        berat = parse_berat(line)
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            self.lines_read += 1
+            if berat is None:
+                self.parse_errors += 1
+                return
+            self.samples.append((ts, berat))
+            self._recent.append(berat)
+            event = self._update_stable(ts)
+        if event is not None and self.on_stable is not None:
+            self.on_stable(*event)
+
+    def _update_stable(self, ts):
+        if len(self._recent) < self.window:
+            return None
+        event = None
+        mean = sum(self._recent) / self.window
+        var = sum((x - mean) ** 2 for x in self._recent) / self.window
+        stable = var <= self.tolerance ** 2
+        if stable:
+            self.last_stable = (ts, mean)
+            if not self._was_stable and mean >= self.min_weight:
+                # Awal plateau baru = satu objek selesai ditimbang
+                event = (ts, mean)
+                self.stable_events.append(event)
+        self._was_stable = stable
+        return event
+
+    def latest(self):
+        """Sampel terakhir (ts, berat) atau None."""
+        with self.lock:
+            return self.samples[-1] if self.samples else None
+
+    def stable_weight(self):
+        """Berat stabil terakhir (ts, berat) atau None, tanpa menunggu."""
+        with self.lock:
+            return self.last_stable
+
+    def stable_events_since(self, ts):
+        with self.lock:
+            return [event for event in self.stable_events if event[0] > ts]
+
+
+_reader = None
+
+
+def baca_berat(port=None, baudrate=None):
+    """Kompatibel dengan versi lama: kembalikan berat stabil terakhir (float), tidak blocking.
+
+    Tanpa argumen, port dan opsi lain diambil dari settings.json "scale" seperti pada pipeline.
+    """
+    global _reader
+    if _reader is None:
+        scale_settings = dict(load_settings().get("scale", {}))
+        port = port or scale_settings.pop("port", None) or DEFAULT_PORT
+        scale_settings.pop("port", None)
+        if baudrate is not None:
+            scale_settings["baudrate"] = baudrate
+        _reader = ScaleReader(port, **scale_settings).start()
+    stable = _reader.stable_weight()
+    if stable is None:
+        return 0.0
+    print(f"Berat: {stable[1]:.3f}")
+    return stable[1]
@@ -0,0 +1,150 @@
+"""Settings di memori dengan penyimpanan tertunda dan atomik ke data/settings.json.
+
+Perubahan (mis. tiap tick slider) hanya mengubah dict di memori dan memberi tahu
+pelanggan; thread latar menulis file sekali setelah perubahan berhenti `delay`
+detik (paling lama `max_delay` detik selama slider terus digeser). File ditulis ke
+.tmp lalu di-rename, jadi listrik padam saat menulis tidak merusak settings.json.
+"""
+import copy
+import json
+import os
+import threading
+import time
+
+from throughput import save_json_atomic
+
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "data/settings.json")
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Baca settings.json; file rusak disisihkan ke .rusak dan dilaporkan, bukan diam-diam jadi {}."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        rusak = path + ".rusak"
+        try:
+            os.replace(path, rusak)
+        except OSError as move_error:
+            print(f"⚠️ {path} rusak ({e}) dan tidak bisa disisihkan ({move_error}); memakai settings default")
+            return {}
+        print(f"⚠️ {path} rusak ({e}); disimpan sebagai {rusak}, memakai settings default")
+        return {}
+    except OSError as e:
+        print(f"⚠️ {path} tidak bisa dibaca ({e}); memakai settings default")
+        return {}
+
+
+class SettingsStore:
+    """Satu sumber settings untuk UI dan pipeline.
+
+    `data` boleh dibaca langsung; perubahan lewat `set`/`update` supaya tersimpan
+    dan pelanggan `subscribe(section, fn)` dipanggil dengan nilai section yang baru
+    (di thread pemanggil, jadi `fn` harus cepat).
+    """
+
+    def __init__(self, path=SETTINGS_FILE, delay=0.5, max_delay=5.0):
+        self.path = path
+        self.delay = delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.data = load_settings(path)
+        self.listeners = {}
+        self.flushes = 0
+        self._dirty_since = None
+        self._last_change = 0.0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def get(self, section, default=None):
+        return self.data.get(section, default)
+
+    def subscribe(self, section, fn):
+        self.listeners.setdefault(section, []).append(fn)
+
+    def set(self, section, value):
+        """Ganti seluruh section."""
+        with self.lock:
+            if self.data.get(section) == value:
+                return
+            self.data[section] = value
+            self._mark_dirty()
+        self._notify(section, value)
+
+    def update(self, section, values):
+        """Gabungkan `values` ke section berbentuk dict."""
+        with self.lock:
+            current = self.data.get(section)
+            if not isinstance(current, dict):
+                current = self.data[section] = {}
+            changed = {key: value for key, value in values.items() if current.get(key, object()) != value}
+            if not changed:
+                return  # slider bergeser tapi nilai bulatnya sama
+            current.update(changed)
+            self._mark_dirty()
+        self._notify(section, current)
+
+    def _mark_dirty(self):
+        now = time.monotonic()
+        self._last_change = now
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._wake.set()
+
+    def _notify(self, section, value):
+        for fn in self.listeners.get(section, []):
+            try:
+                fn(value)
+            except Exception as e:
+                print(f"⚠️ Pelanggan settings '{section}' gagal: {e}")
+
+    def flush(self):
+        """Tulis sekarang jika ada perubahan yang belum tersimpan."""
+        with self.lock:
+            if self._dirty_since is None:
+                return False
+            data = copy.deepcopy(self.data)
+            self._dirty_since = None
+        try:
+            save_json_atomic(self.path, data, indent=2)
+        except OSError as e:
+            print(f"⚠️ Gagal menyimpan settings: {e}")
+            with self.lock:
+                if self._dirty_since is None:
+                    self._dirty_since = time.monotonic()
+            return False
+        self.flushes += 1
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stopped.is_set():
+                with self.lock:
+                    if self._dirty_since is None:
+                        break
+                    due = min(self._last_change + self.delay, self._dirty_since + self.max_delay)
+                wait = due - time.monotonic()
+                if wait <= 0:
+                    if self.flush():
+                        break
+                    # Gagal menulis: perubahan tetap ditandai, coba lagi nanti tanpa menunggu perubahan baru
+                    self._stopped.wait(self.max_delay)
+                    continue
+                self._stopped.wait(wait)
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.flush()
@@ -0,0 +1,64 @@
+"""Timbangan palsu lewat pseudo-terminal untuk menguji ScaleReader tanpa hardware.
+
+Jalankan, lalu isi "scale": {"port": "<path yang dicetak>"} di settings.json,
+atau pakai mode --cek untuk langsung membaca dengan ScaleReader.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def tulis_stream(master_fd, rate_hz=20, min_berat=0.2, max_berat=3.0, durasi_ikan=1.5, jeda=1.0, durasi=None):
+    """Pola conveyor: kosong -> naik -> plateau (berat ikan + noise) -> kosong."""
+    t_end = None if durasi is None else time.time() + durasi
+    dt = 1.0 / rate_hz
+    while t_end is None or time.time() < t_end:
+        berat = round(random.uniform(min_berat, max_berat), 3)
+        for _ in range(int(jeda * rate_hz)):
+            os.write(master_fd, f"{random.uniform(-0.003, 0.003):.3f} kg\r\n".encode())
+            time.sleep(dt)
+        for _ in range(int(durasi_ikan * rate_hz)):
+            os.write(master_fd, f"{berat + random.uniform(-0.003, 0.003):.3f} kg\r\n".encode())
+            time.sleep(dt)
+        print(f"🐟 ikan {berat} kg")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cek", action="store_true", help="baca sendiri dengan ScaleReader")
+    parser.add_argument("--durasi", type=float, default=None)
+    args = parser.parse_args()
+
+    import tty
+
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    port = os.ttyname(slave_fd)
+    print(f"⚖️ Timbangan simulasi di: {port}")
+
+    if args.cek:
+        import threading
+
+        from sensor_timbangan import ScaleReader
+
+        reader = ScaleReader(port).start()
+        threading.Thread(target=tulis_stream, args=(master_fd,), kwargs={"durasi": args.durasi}, daemon=True).start()
+        t_end = time.time() + (args.durasi or 10)
+        seen = 0
+        while time.time() < t_end:
+            events = list(reader.stable_events)
+            for ts, berat in events[seen:]:
+                print(f"✅ stabil {berat:.3f} kg")
+            seen = len(events)
+            time.sleep(0.2)
+        reader.stop()
+    else:
+        tulis_stream(master_fd, durasi=args.durasi)
+
+
+if __name__ == "__main__":
+    main()
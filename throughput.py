@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+from box_classifier import TRASH
+
+# Box yang selalu tampil di dashboard; box lain dari aturan "klasifikasi" ditambahkan saat terisi
+BOX_KEYS = ["A1", "A2", "A3", "B1", "B2", "B3", "C1", "C2", "C3"]
+WINDOWS = {"1m": 60, "5m": 300, "60m": 3600}
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data/data.json")
+
+
+class ThroughputAggregator:
+    """Total dan laju (pcs/kg per jam) yang di-update O(1) per deteksi.
+
+    Laju dihitung dari ring buffer per detik sepanjang 60 menit. Untuk tiap
+    jendela (1, 5, 60 menit) disimpan jumlah berjalan: bucket yang keluar dari
+    jendela dikurangkan saat waktu maju, jadi baca laju juga O(1).
+    """
+
+    def __init__(self, windows=WINDOWS, now=None):
+        self.windows = dict(windows)
+        self.size = max(self.windows.values())
+        self.lock = threading.Lock()
+        self.bucket_pcs = [0] * self.size
+        self.bucket_kg = [0.0] * self.size
+        self.sum_pcs = {name: 0 for name in self.windows}
+        self.sum_kg = {name: 0.0 for name in self.windows}
+        self.reset(now)
+
+    def reset(self, now=None):
+        with self.lock:
+            self.pcs_sorted = 0
+            self.kg_sorted = 0.0
+            self.box_kg = {key: 0.0 for key in BOX_KEYS}
+            self.trash_kg = 0.0
+            # Jumlah ekor per box/jenis sejak start (untuk endpoint metrik, tidak disimpan)
+            self.box_pcs = {}
+            self.jenis_pcs = {}
+            self._clear_windows(now)
+
+    def _clear_windows(self, now=None):
+        now = time.time() if now is None else now
+        self.start_time = now
+        self.last_sec = int(now)
+        for i in range(self.size):
+            self.bucket_pcs[i] = 0
+            self.bucket_kg[i] = 0.0
+        for name in self.windows:
+            self.sum_pcs[name] = 0
+            self.sum_kg[name] = 0.0
+
+    def load(self, json_data):
+        """Lanjutkan total dari data.json (laju dimulai dari nol)."""
+        info = json_data.get("info_data", {})
+        boxes = json_data.get("box_manager", {})
+        with self.lock:
+            self.pcs_sorted = int(float(info.get("pcs_sorted", 0) or 0))
+            self.kg_sorted = float(info.get("kg_sorted", 0) or 0)
+            for key in BOX_KEYS + sorted(set(boxes) - set(BOX_KEYS)):
+                self.box_kg[key] = float(boxes.get(key, 0) or 0)
+            self.trash_kg = float(json_data.get("trash", 0) or 0)
+
+    def _advance(self, now):
+        sec = int(now)
+        if sec <= self.last_sec:
+            return
+        if sec - self.last_sec >= self.size:
+            # Jeda lebih lama dari jendela terpanjang: semua bucket kedaluwarsa
+            start_time = self.start_time
+            self._clear_windows(now)
+            self.start_time = start_time
+            return
+        for s in range(self.last_sec + 1, sec + 1):
+            for name, width in self.windows.items():
+                idx = (s - width) % self.size
+                self.sum_pcs[name] -= self.bucket_pcs[idx]
+                self.sum_kg[name] -= self.bucket_kg[idx]
+            idx = s % self.size
+            self.bucket_pcs[idx] = 0
+            self.bucket_kg[idx] = 0.0
+        self.last_sec = sec
+
+    def add(self, jenis, berat, box, now=None):
+        now = time.time() if now is None else now
+        berat = float(berat)
+        with self.lock:
+            self._advance(now)
+            idx = int(now) % self.size
+            self.bucket_pcs[idx] += 1
+            self.bucket_kg[idx] += berat
+            for name in self.windows:
+                self.sum_pcs[name] += 1
+                self.sum_kg[name] += berat
+
+            self.pcs_sorted += 1
+            self.kg_sorted += berat
+            self.box_pcs[box] = self.box_pcs.get(box, 0) + 1
+            self.jenis_pcs[jenis] = self.jenis_pcs.get(jenis, 0) + 1
+            if box is None or box == TRASH:
+                self.trash_kg += berat
+            else:
+                self.box_kg[box] = self.box_kg.get(box, 0.0) + berat
+
+    def reset_box(self, key):
+        with self.lock:
+            if key in self.box_kg:
+                self.box_kg[key] = 0.0
+
+    def reset_trash(self):
+        with self.lock:
+            self.trash_kg = 0.0
+
+    def rates(self, now=None):
+        """{"1m": (pcs_per_jam, kg_per_jam), ...}; jendela dipendekkan selama belum penuh."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._advance(now)
+            elapsed = max(1.0, now - self.start_time)
+            hasil = {}
+            for name, width in self.windows.items():
+                span = min(width, elapsed)
+                hasil[name] = (self.sum_pcs[name] * 3600.0 / span, self.sum_kg[name] * 3600.0 / span)
+            return hasil
+
+    def counts(self):
+        """(pcs per box, pcs per jenis) sejak start/reset."""
+        with self.lock:
+            return dict(self.box_pcs), dict(self.jenis_pcs)
+
+    def snapshot(self, rate_window="5m", now=None):
+        """Struktur yang sama dengan data.json (nilai berupa string)."""
+        rates = self.rates(now)
+        pcs_per_hour, kg_per_hour = rates[rate_window]
+        with self.lock:
+            return {
+                "info_data": {
+                    "pcs_sorted": str(self.pcs_sorted),
+                    "kg_sorted": f"{self.kg_sorted:.2f}",
+                    "pcs_per_hour": f"{pcs_per_hour:.0f}",
+                    "kg_per_hour": f"{kg_per_hour:.1f}",
+                },
+                "box_manager": {key: f"{val:.2f}" for key, val in self.box_kg.items()},
+                "trash": f"{self.trash_kg:.2f}",
+                "rates": {name: {"pcs_per_hour": round(p, 1), "kg_per_hour": round(k, 2)} for name, (p, k) in rates.items()},
+            }
+
+    def save_snapshot(self, path=DATA_FILE):
+        save_json_atomic(path, self.snapshot())
+
+    def start_autosave(self, path=DATA_FILE, interval=10.0):
+        """Simpan snapshot berkala di thread terpisah, bukan di setiap deteksi."""
+        self._autosave_stop = threading.Event()
+
+        def loop():
+            while not self._autosave_stop.wait(interval):
+                self.save_snapshot(path)
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop_autosave(self, path=DATA_FILE):
+        if getattr(self, "_autosave_stop", None) is not None:
+            self._autosave_stop.set()
+            self.save_snapshot(path)
+
+
+def save_json_atomic(path, data, indent=4):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
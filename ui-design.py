@@ -1,30 +1,18 @@
 import customtkinter as ctk
-from PIL import Image, ImageTk
-import cv2
+from PIL import Image
 import os
-import json
 import time
 import datetime
-from computer_vision import SimpleDetector
-from simulasi.simulasi_sensor_berat import baca_berat
-from backend_log import simpan_log_deteksi, log_system_activity, ambil_semua_log
+import queue
+from pipeline import SortingPipeline
+from backend_log import log_system_activity, ambil_log, format_waktu
+from instrumentation import metrics
+from preview import PreviewRenderer
+from settings_store import SettingsStore
 
-class App(ctk.CTk):
-    def load_settings(self):
-        self.settings_path = os.path.join(os.path.dirname(__file__), "data/settings.json")
-        if os.path.exists(self.settings_path):
-            with open(self.settings_path, "r") as f:
-                try:
-                    self.settings_data = json.load(f)
-                except Exception:
-                    self.settings_data = {}
-        else:
-            self.settings_data = {}
+MAX_LOG_LINES = 500  # baris log yang ditampilkan di panel
 
-    def save_settings(self):
-        with open(self.settings_path, "w") as f:
-            json.dump(self.settings_data, f, indent=2)
-            
+class App(ctk.CTk):
     def ensure_box_manager_structure(self):
         box_data = self.json_data.get("box_manager")
         if not isinstance(box_data, dict):
@@ -56,7 +44,9 @@ class App(ctk.CTk):
     def __init__(self):
         super().__init__()
 
-        self.load_settings()
+        # Slider hanya mengubah settings di memori; file ditulis tertunda di thread lain
+        self.settings_store = SettingsStore().start()
+        self.settings_data = self.settings_store.data
 
         # -- Konfigurasi Jendela Utama --
         self.title("Fish Sorting UI")
@@ -68,8 +58,24 @@ class App(ctk.CTk):
         self.settings_window = None
         self.timer_label = None # Inisialisasi timer label
         self.system_running = False
-        self.last_saved_time = 0  # untuk delay antar penyimpanan
-        self.computer_vision = SimpleDetector("data/keras_model.h5", "data/labels.txt", confidence_threshold=0.8)
+        self.startup_t0 = time.perf_counter()
+        instrumentation_settings = self.settings_data.get("instrumentation", {})
+        metrics.enabled = instrumentation_settings.get("enabled", False)
+        self.metrics_overlay_visible = metrics.enabled and instrumentation_settings.get("overlay", True)
+        self.bind("<F2>", lambda event: self.toggle_metrics_overlay())
+        self.bind("<F3>", lambda event: self.dump_metrics())
+        # Semua proses sortir ada di SortingPipeline; UI ini hanya klien yang menempel
+        self.pipeline = SortingPipeline(store=self.settings_store)
+        self.throughput = self.pipeline.throughput
+        self.detection_worker = self.pipeline.detection_worker
+        self.json_data = self.throughput.snapshot()
+        self.sorted_events = queue.Queue()  # event lengkap untuk label di UI
+        self.pipeline.add_listener(self.sorted_events.put)
+        self.pipeline.metrics_collector.queues["sorted_events"] = self.sorted_events
+        self.log_last_id = None
+        self.log_line_count = 0
+        self.refresh_job = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Grid utama
         self.grid_columnconfigure(0, weight=3, uniform="a")
@@ -85,6 +91,13 @@ class App(ctk.CTk):
         self.create_velocity_manager_frame()
         self.create_log_activity_frame()
         self.synchronize_section_heights()
+        print(f"⏱️ UI siap dalam {(time.perf_counter() - self.startup_t0) * 1000:.1f} ms")
+        # Model dimuat di thread pipeline; kamera sudah tampil selama menunggu
+        self.pipeline.start()
+
+    @property
+    def computer_vision(self):
+        return self.pipeline.detector
 
     def synchronize_section_heights(self):
         self.update_idletasks()
@@ -122,7 +135,11 @@ class App(ctk.CTk):
 
         self.webcam_label = ctk.CTkLabel(self.cam_content, text="")
         self.webcam_label.grid(row=0, column=0, padx=20, pady=(20,10), sticky="nsew")
-        self.cap = cv2.VideoCapture(0)
+
+        # Overlay metrik per tahap (F2 tampil/sembunyi, F3 simpan ke file)
+        self.metrics_label = ctk.CTkLabel(self.cam_content, text="", font=ctk.CTkFont(family="Courier", size=11), text_color="#22c55e", fg_color="#111827", corner_radius=6, justify="left", anchor="nw")
+        if self.metrics_overlay_visible:
+            self.metrics_label.grid(row=0, column=0, padx=28, pady=(28,0), sticky="nw")
 
         # Frame info objek dan waktu
         info_frame = ctk.CTkFrame(self.cam_content, fg_color="#e0e7ff", corner_radius=10)
@@ -149,43 +166,26 @@ class App(ctk.CTk):
         self.timer_label = ctk.CTkLabel(waktu_frame, text="00:00:00", font=ctk.CTkFont(size=16, weight="bold"), text_color="#2563eb")
         self.timer_label.pack(anchor="e")
 
+        # Preview punya laju sendiri (settings "preview": {"fps": ...}), lepas dari laju inferensi
+        preview_settings = self.settings_data.get("preview", {})
+        self.preview = PreviewRenderer(self.webcam_label, self.detection_worker.latest_frame, size=(533, 400), fps=preview_settings.get("fps", 15)).start()
         self.update_webcam()
-        
+        self.update_metrics_overlay()
+
     def update_webcam(self):
-        ret, frame = self.cap.read()
-        if not ret:
+        # Hanya polling hasil worker; capture & inferensi berjalan di thread lain, preview di PreviewRenderer
+        for result in self.detection_worker.poll_results():
+            if self.system_running and result["stabil"]:
+                self.jenis_deteksi.configure(text=result["label"])
+        while not self.sorted_events.empty():
+            event = self.sorted_events.get_nowait()
+            self.berat_deteksi.configure(text=f"{event['berat']:.2f} Kg")
+
+        if self.pipeline.failed.is_set():
+            # Pipeline sudah berhenti sendiri; tampilkan alasannya dan jangan polling lagi
+            self.jenis_deteksi.configure(text="Model gagal dimuat", text_color="#ef4444")
+            self.webcam_label.configure(text=self.pipeline.load_error)
             return
-
-        now = time.time()
-        # # label, conf, is_detected = self.predict(frame, now)
-        label, conf, is_detected = self.computer_vision.stable_detect(frame, now)
-
-        if self.system_running and is_detected:
-            # print(f"✅ Ikan terdeteksi: {label} ({conf:.1%})")
-            self.jenis_deteksi.configure(text=label)
-            if now - self.last_saved_time >= 2.0:  # delay 2 detik antar simpan
-                berat = baca_berat()
-                self.berat_deteksi.configure(text=f"{berat:.2f} Kg")
-                simpan_log_deteksi(label, berat)
-                self.last_saved_time = now
-                print(f"✅ Data disimpan: {label}, {berat} Kg")
-        # else:
-        #     self.jenis_deteksi.configure(text="-")
-
-        # Tampilkan ke UI
-        if conf >= self.computer_vision.confidence_threshold:
-            cv2.putText(frame, f"{label}: {conf:.1%}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        else:
-            cv2.putText(frame, "🔍 Mencari objek...", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (150, 150, 150), 2)
-
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame_rgb)
-        img = img.resize((533, 400))
-        imgtk = ImageTk.PhotoImage(image=img)
-
-        self.webcam_label.imgtk = imgtk
-        self.webcam_label.configure(image=imgtk)
-
         self.after(17, self.update_webcam)
 
     # Informasi pada objek terdeteksi
@@ -306,15 +306,12 @@ class App(ctk.CTk):
         self.accel_frame.grid_rowconfigure(num_sliders + 1, weight=1)
 
     def on_conveyor_slider_change_named(self, key, value, label=None):
-        if "conveyor" not in self.settings_data or not isinstance(self.settings_data["conveyor"], dict):
-            self.settings_data["conveyor"] = {}
         v = int(round(value))
         v = max(0, min(20, v))
         
-        self.settings_data["conveyor"][key] = v
         if label is not None:
             label.configure(text=str(v))
-        self.save_settings()
+        self.settings_store.update("conveyor", {key: v})
 
     def create_log_activity_frame(self):
         frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -370,17 +367,20 @@ class App(ctk.CTk):
             return
 
         self.system_running = True
-        
+        self.detection_worker.set_active(True)
+
         if not hasattr(self, 'timer_seconds'):
             self.timer_seconds = 0
         self.update_timer()
-        self.load_json_data()
+        self.json_data = self.throughput.snapshot()
         self.update_all_sections()
+        self.start_refresh_loop()
         # self.log_activity("Sistem dimulai.")
         log_system_activity("Sistem dimulai.")
 
     def stop_system(self):
         self.system_running = False
+        self.detection_worker.set_active(False)
         if hasattr(self, 'timer_job'):
             self.after_cancel(self.timer_job)
         # self.log_activity("Sistem dihentikan.")
@@ -388,6 +388,7 @@ class App(ctk.CTk):
 
     def reset_system(self):
         self.system_running = False
+        self.detection_worker.set_active(False)
         if hasattr(self, 'timer_job'):
             self.after_cancel(self.timer_job)
         self.timer_seconds = 0
@@ -417,40 +418,16 @@ class App(ctk.CTk):
         s = seconds % 60
         return f"{h:02}:{m:02}:{s:02}"
 
-    def load_json_data(self):
-        json_path = os.path.join(os.path.dirname(__file__), "data/data.json")
-        print("Memuat dari:", json_path)
-        if not os.path.exists(json_path):
-            raise FileNotFoundError(f"File data.json tidak ditemukan di: {json_path}")
-
-        with open(json_path, "r") as f:
-            try:
-                self.json_data = json.load(f)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Gagal memuat data.json: {e}")
-
     def reset_data(self):
-        self.json_data = {
-            "info_data": {
-                "pcs_sorted": "0", "kg_sorted": "0", "pcs_per_hour": "0", "kg_per_hour": "0"
-            },
-            "box_manager": {
-                "A1": "0", "A2": "0", "A3": "0",
-                "B1": "0", "B2": "0", "B3": "0",
-                "C1": "0", "C2": "0", "C3": "0"
-            },
-            "trash": "0"
-            # "log_activity": []
-        }
-
-        json_path = os.path.join(os.path.dirname(__file__), "data/data.json")
-        with open(json_path, "w") as f:
-            json.dump(self.json_data, f, indent=4)
+        self.throughput.reset()
+        self.json_data = self.throughput.snapshot()
+        self.throughput.save_snapshot()
 
         # Kosongkan log di UI
         self.log_textbox.configure(state="normal")
         self.log_textbox.delete("1.0", "end")
         self.log_textbox.configure(state="disabled")
+        self.log_line_count = 0
 
     def update_all_sections(self):
         self.ensure_box_manager_structure()
@@ -478,25 +455,70 @@ class App(ctk.CTk):
         # Update trash
         self.trash_btn.configure(text=f"TRASH\n{self.json_data.get('trash', '0')} Kg")
 
-        # Update log activity
-        self.log_textbox.configure(state="normal")
-        self.log_textbox.delete("1.0", "end")
+    def format_log_entry(self, log):
+        waktu = format_waktu(log["ts"])
+        if log["tipe"] == "deteksi":
+            return f"{waktu} Ikan {log['jenis']} - {log['berat']}Kg → {log['box']}"
+        elif log["tipe"] == "sistem":
+            return f"{waktu} [system] {log['pesan']}"
+        return f"{waktu} [UNKNOWN] {log}"
+
+    def refresh_log_panel(self):
+        # Hanya ambil entri setelah id terakhir yang sudah tampil
+        if self.log_last_id is None:
+            log_data = list(reversed(ambil_log(limit=MAX_LOG_LINES, urut_terbaru=True)))
+        else:
+            log_data = ambil_log(setelah_id=self.log_last_id)
+        if not log_data:
+            return
 
-        log_data = ambil_semua_log()
+        self.log_textbox.configure(state="normal")
+        for log in log_data[-MAX_LOG_LINES:]:
+            self.log_textbox.insert("end", self.format_log_entry(log) + "\n")
+        self.log_line_count += min(len(log_data), MAX_LOG_LINES)
+        self.log_last_id = log_data[-1]["id"]
+
+        # Batasi jumlah baris supaya textbox tidak terus membesar
+        excess = self.log_line_count - MAX_LOG_LINES
+        if excess > 0:
+            self.log_textbox.delete("1.0", f"{excess + 1}.0")
+            self.log_line_count = MAX_LOG_LINES
+        self.log_textbox.configure(state="disabled")
+        self.log_textbox.see("end")
 
-        for log in log_data:
-            if log["tipe"] == "deteksi":
-                entry = f"{log['waktu']} Ikan {log['jenis']} - {log['berat']}Kg → {log['box']}"
-            elif log["tipe"] == "sistem":
-                entry = f"{log['waktu']} [system] {log['pesan']}"
-            else:
-                entry = f"{log['waktu']} [UNKNOWN] {log}"
+    def start_refresh_loop(self):
+        # Cukup satu loop, walau START ditekan berkali-kali
+        if self.refresh_job is not None:
+            return
+        self.refresh_loop()
 
-            self.log_textbox.insert("end", entry + "\n")
+    def refresh_loop(self):
+        self.json_data = self.throughput.snapshot()
+        self.update_all_sections()
+        self.refresh_log_panel()
+        self.refresh_job = self.after(1000, self.refresh_loop)
+
+    def update_metrics_overlay(self):
+        if self.metrics_overlay_visible:
+            self.metrics_label.configure(text="\n".join(metrics.overlay_lines()) or "menunggu data...")
+        self.after(1000, self.update_metrics_overlay)
+
+    def toggle_metrics_overlay(self):
+        # Overlay menyalakan instrumentasi; menyembunyikannya tidak mematikan pengukuran
+        self.metrics_overlay_visible = not self.metrics_overlay_visible
+        if self.metrics_overlay_visible:
+            metrics.enabled = True
+            self.metrics_label.grid(row=0, column=0, padx=28, pady=(28,0), sticky="nw")
+        else:
+            self.metrics_label.grid_remove()
 
-        self.log_textbox.configure(state="disabled")
-        self.after(1000, self.update_all_sections)
-        self.log_textbox.see("end")
+    def dump_metrics(self):
+        if not metrics.enabled:
+            print("⚠️ Instrumentasi belum aktif (tekan F2 atau isi \"instrumentation\" di settings.json)")
+            return
+        path = metrics.dump()
+        print(f"📊 Metrik disimpan: {path}")
+        log_system_activity(f"Metrik disimpan ke {os.path.basename(path)}")
 
     def confirm_system_reset(self):
         alert = ctk.CTkToplevel(self)
@@ -518,14 +540,16 @@ class App(ctk.CTk):
 
     def reset_box_value(self, row, col, alert_window):
         key = f"{chr(65 + col)}{row + 1}"
-        self.json_data['box_manager'][key] = "0"
+        self.throughput.reset_box(key)
+        self.json_data = self.throughput.snapshot()
         self.update_all_sections()
         log_system_activity(f"Box {key} direset.")
         if alert_window:
             alert_window.destroy()
 
     def reset_trash_value(self, alert_window):
-        self.json_data['trash'] = "0"
+        self.throughput.reset_trash()
+        self.json_data = self.throughput.snapshot()
         self.update_all_sections()
         log_system_activity("Box sampah direset.")
         if alert_window:
@@ -569,10 +593,7 @@ class App(ctk.CTk):
             value_label.grid(row=row, column=2, sticky="e", padx=(10, 20))
             def update_label_and_save(value):
                 value_label.configure(text=f"{int(value)}")
-                if "camera" not in self.settings_data:
-                    self.settings_data["camera"] = {}
-                self.settings_data["camera"][key] = int(value)
-                self.save_settings()
+                self.settings_store.update("camera", {key: int(value)})
             slider.configure(command=update_label_and_save)
 
         slider_labels = [
@@ -586,15 +607,58 @@ class App(ctk.CTk):
             create_slider_row(cam_frame, label, i + 1, key)
 
         def on_auto_checkbox_change():
-            if "camera" not in self.settings_data:
-                self.settings_data["camera"] = {}
-            self.settings_data["camera"]["auto"] = bool(auto_var.get())
-            self.save_settings()
+            self.settings_store.update("camera", {"auto": bool(auto_var.get())})
 
         auto_var = ctk.IntVar(value=1 if self.settings_data.get("camera", {}).get("auto", False) else 0)
         auto_checkbox = ctk.CTkCheckBox(cam_frame, text="Auto", variable=auto_var, command=on_auto_checkbox_change)
         auto_checkbox.grid(row=len(slider_labels) + 1, column=2, sticky="e", padx=20, pady=10)
 
+        # ROI belt per lane: x, y, lebar, tinggi (piksel frame kamera). Baris kosong = tidak dipakai
+        roi_row = len(slider_labels) + 2
+        ctk.CTkLabel(cam_frame, text="ROI Belt (x, y, w, h)", font=ctk.CTkFont(size=14, weight="bold")).grid(row=roi_row, column=0, columnspan=3, sticky="w", padx=20, pady=(10, 0))
+        roi_settings = self.settings_data.get("roi", [])
+        self.roi_entries = []
+        for lane in range(3):
+            ctk.CTkLabel(cam_frame, text=f"Lane {lane+1}", font=ctk.CTkFont(size=14)).grid(row=roi_row + lane + 1, column=0, sticky="w", padx=(20, 10))
+            lane_frame = ctk.CTkFrame(cam_frame, fg_color="transparent")
+            lane_frame.grid(row=roi_row + lane + 1, column=1, sticky="w", padx=10, pady=5)
+            values = roi_settings[lane] if lane < len(roi_settings) else ["", "", "", ""]
+            entries = []
+            for val in values:
+                entry = ctk.CTkEntry(lane_frame, width=60)
+                entry.insert(0, str(val))
+                entry.pack(side="left", padx=(0, 5))
+                entries.append(entry)
+            self.roi_entries.append(entries)
+
+        def save_roi_settings():
+            # Ukuran frame kamera terakhir (jika sudah ada) untuk cek ROI di luar gambar
+            _, frame = self.detection_worker.latest_frame()
+            frame_h, frame_w = frame.shape[:2] if frame is not None else (None, None)
+            default_border = ctk.ThemeManager.theme["CTkEntry"]["border_color"]
+            rois = []
+            for entries in self.roi_entries:
+                values = [entry.get().strip() for entry in entries]
+                if not any(values):
+                    continue  # lane tidak dipakai
+                try:
+                    x, y, w, h = [int(v) for v in values]
+                    valid = x >= 0 and y >= 0 and w > 0 and h > 0
+                    if frame_w is not None:
+                        valid = valid and x + w <= frame_w and y + h <= frame_h
+                except ValueError:
+                    valid = False
+                for entry in entries:
+                    entry.configure(border_color=default_border if valid else "#ef4444")
+                if valid:
+                    rois.append([x, y, w, h])
+                else:
+                    print(f"⚠️ ROI tidak valid dilewati: {values}")
+            # Detector menerima ROI baru lewat pelanggan "roi" di pipeline
+            self.settings_store.set("roi", rois)
+
+        ctk.CTkButton(cam_frame, text="Save ROI", width=80, fg_color="#22c55e", hover_color="#16a34a", command=save_roi_settings).grid(row=roi_row + 4, column=2, sticky="e", padx=20, pady=(5, 15))
+
         # 2. Range Settings
         range_frame = ctk.CTkFrame(main_frame, fg_color="white", border_width=1, border_color="#d1d5db", corner_radius=10)
         range_frame.grid(row=2, column=0, sticky="new", padx=10, pady=10)
@@ -634,13 +698,12 @@ class App(ctk.CTk):
                 entry_y.delete(0, 'end')
 
         def save_range_settings():
-            if "range" not in self.settings_data:
-                self.settings_data["range"] = {}
+            ranges = {}
             for key, (entry_x, entry_y) in self.range_entries.items():
                 x_val = entry_x.get()
                 y_val = entry_y.get()
-                self.settings_data["range"][key] = [x_val, y_val]
-            self.save_settings()
+                ranges[key] = [x_val, y_val]
+            self.settings_store.update("range", ranges)
 
         ctk.CTkButton(range_frame, text="Save", width=80, fg_color="#22c55e", hover_color="#16a34a", command=save_range_settings).grid(row=4, column=3, sticky="e", padx=10, pady=(5,15))
         button_bar = ctk.CTkFrame(self.settings_window, fg_color="transparent")
@@ -657,18 +720,29 @@ class App(ctk.CTk):
         db_frame.grid_columnconfigure(1, weight=1)
         ctk.CTkLabel(db_frame, text="Database Settings", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=2, sticky="w", padx=20, pady=(15, 10))
         
-        db_entries = {"Database Host": "localhost", "Database Name": "", "Username": "", "Password": "", "Port": ""}
-        for i, (label, placeholder) in enumerate(db_entries.items()):
+        db_entries = {"Database Host": ("host", "localhost"), "Database Name": ("name", ""), "Username": ("user", ""), "Password": ("password", ""), "Port": ("port", "")}
+        db_settings = self.settings_data.get("database", {})
+        self.db_entries = {}
+        for i, (label, (key, placeholder)) in enumerate(db_entries.items()):
             ctk.CTkLabel(db_frame, text=label, font=ctk.CTkFont(size=14)).grid(row=i+1, column=0, sticky="w", padx=20, pady=8)
             show_char = "*" if label == "Password" else ""
             entry = ctk.CTkEntry(db_frame, placeholder_text=placeholder, show=show_char)
             entry.grid(row=i+1, column=1, sticky="ew", padx=20, pady=8)
-        ctk.CTkButton(db_frame, text="Save", width=80, fg_color="#22c55e", hover_color="#16a34a").grid(row=len(db_entries)+1, column=1, sticky="e", padx=20, pady=(5,15))
+            if db_settings.get(key):
+                entry.insert(0, str(db_settings[key]))
+            self.db_entries[key] = entry
+
+        def save_db_settings():
+            # Pipeline menyalakan ulang sinkronisasi lewat pelanggan "database"
+            self.settings_store.update("database", {key: entry.get().strip() for key, entry in self.db_entries.items()})
+
+        ctk.CTkButton(db_frame, text="Save", width=80, fg_color="#22c55e", hover_color="#16a34a", command=save_db_settings).grid(row=len(db_entries)+1, column=1, sticky="e", padx=20, pady=(5,15))
 
         
 
         def on_apply_clicked():
             save_range_settings()
+            save_roi_settings()
             self.on_settings_close()
 
         ctk.CTkButton(btn_container, text="Apply", width=120, height=35, fg_color="#22c55e", hover_color="#16a34a", font=ctk.CTkFont(weight="bold"), command=on_apply_clicked).pack(side="left", padx=(5,0))
@@ -678,6 +752,12 @@ class App(ctk.CTk):
             self.settings_window.destroy()
             self.settings_window = None
 
+    def on_close(self):
+        self.preview.stop()
+        self.pipeline.stop()
+        self.settings_store.close()
+        self.destroy()
+
 
 if __name__ == "__main__":
     ctk.set_appearance_mode("light")